@@ -0,0 +1,409 @@
+import os
+import logging
+import threading
+import time
+from itertools import chain
+from flask import Blueprint, request, jsonify
+from pymongo import MongoClient, UpdateOne
+from bson import ObjectId
+from datetime import datetime, timedelta
+from auth import require_role
+from policies import with_policy
+from statuses import PENDING, IN_PROGRESS, RESOLVED, COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Create a Blueprint for the analytics API
+analytics_api = Blueprint('analytics_api', __name__)
+
+# Grievance fields the analytics job needs from the document before a change
+ANALYTICS_FIELDS = {
+    "status": 1, "contractor_id": 1, "submitted_at": 1, "assigned_at": 1,
+    "completed_at": 1, "latitude": 1, "longitude": 1
+}
+
+# Size of an area cell in degrees (about 1 km at city latitudes)
+AREA_CELL_DEGREES = 0.01
+
+# How often the background job drains the change queue, and how much per run
+ANALYTICS_INTERVAL = int(os.getenv('ANALYTICS_INTERVAL', 10))
+ANALYTICS_BATCH_SIZE = 500
+
+# A claimed batch left unfinished this long (a worker died) is claimed again
+ANALYTICS_LEASE_SECONDS = 300
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_analytics_indexes(db):
+    db.analytics_queue.create_index([("at", 1)])
+    db.analytics_queue.create_index([("claim", 1)])
+    db.analytics_areas.create_index([("day", 1), ("area", 1)])
+
+def day_key(ts):
+    return ts.strftime('%Y-%m-%d')
+
+def week_key(day):
+    year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+    return f"{year}-W{week:02d}"
+
+def area_key(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    lat = round(float(latitude) / AREA_CELL_DEGREES) * AREA_CELL_DEGREES
+    lng = round(float(longitude) / AREA_CELL_DEGREES) * AREA_CELL_DEGREES
+    return f"{lat:.2f},{lng:.2f}"
+
+# --- WRITE PATH ---
+
+def record_change(db, before, after, at=None):
+    """Queue a grievance change for the analytics job.
+
+    `before` is the grievance as it was (None for a new grievance, otherwise
+    the ANALYTICS_FIELDS projection returned by find_one_and_update) and
+    `after` holds the fields the write set. The request only pays for one
+    small insert; the bucket updates happen in the background.
+    """
+    if before is None and after is None:
+        return
+
+    db.analytics_queue.insert_one({
+        "at": at or datetime.utcnow(),
+        "before": before,
+        "after": {k: after.get(k) for k in ANALYTICS_FIELDS if k in after}
+    })
+
+def record_changes(db, changes, at=None):
+    """Queue many (before, after) grievance changes with a single insert."""
+    at = at or datetime.utcnow()
+    documents = [
+        {"at": at, "before": before, "after": {k: after.get(k) for k in ANALYTICS_FIELDS if k in after}}
+        for before, after in changes
+    ]
+    if not documents:
+        return
+
+    db.analytics_queue.insert_many(documents, ordered=False)
+
+# --- BACKGROUND JOB ---
+
+def seconds_between(start, end):
+    if not start or not end:
+        return None
+    return max((end - start).total_seconds(), 0)
+
+def bucket_increments(change):
+    """Turn one queued change into $inc documents for each bucket collection."""
+    at = change["at"]
+    before = change.get("before") or {}
+    after = dict(before)
+    after.update(change.get("after") or {})
+    is_new = not change.get("before")
+
+    day = day_key(at)
+    area = area_key(after.get("latitude"), after.get("longitude"))
+    daily, areas, contractors = {}, {}, {}
+
+    old_status, new_status = before.get("status"), after.get("status")
+
+    if is_new:
+        daily["opened"] = 1
+        if area:
+            areas["opened"] = 1
+
+    if new_status and (is_new or new_status != old_status):
+        daily[f"status.{new_status}"] = 1
+
+    # First assignment: time waiting for a contractor
+    if after.get("contractor_id") and not before.get("assigned_at") and after.get("assigned_at"):
+        waited = seconds_between(after.get("submitted_at"), at)
+        if waited is not None:
+            daily["durations.assign.sum"] = waited
+            daily["durations.assign.count"] = 1
+
+    # Contractor marks the work done: time spent working
+    if new_status == RESOLVED and old_status != RESOLVED:
+        worked = seconds_between(after.get("assigned_at"), at)
+        if worked is not None:
+            daily["durations.work.sum"] = worked
+            daily["durations.work.count"] = 1
+
+    # Admin verification closes the grievance
+    if new_status == COMPLETED and old_status != COMPLETED:
+        daily["closed"] = 1
+        if area:
+            areas["closed"] = 1
+        resolved = seconds_between(after.get("submitted_at"), at)
+        if resolved is not None:
+            daily["durations.resolve.sum"] = resolved
+            daily["durations.resolve.count"] = 1
+        verified = seconds_between(after.get("completed_at"), at)
+        if verified is not None:
+            daily["durations.verify.sum"] = verified
+            daily["durations.verify.count"] = 1
+
+    # Contractor backlog by status
+    old_key = (before.get("contractor_id"), old_status)
+    new_key = (after.get("contractor_id"), new_status)
+    if is_new:
+        old_key = (None, None)
+    if old_key != new_key:
+        if old_key[0]:
+            contractors.setdefault(old_key[0], {})[f"backlog.{old_key[1]}"] = -1
+        if new_key[0]:
+            contractors.setdefault(new_key[0], {})[f"backlog.{new_key[1]}"] = 1
+
+    return day, area, daily, areas, contractors
+
+def merge_inc(target, key, inc):
+    bucket = target.setdefault(key, {})
+    for field, value in inc.items():
+        bucket[field] = bucket.get(field, 0) + value
+
+def claim_changes(db, now, limit):
+    """Lease up to `limit` of the oldest unclaimed changes; returns the claim id."""
+    expired = now - timedelta(seconds=ANALYTICS_LEASE_SECONDS)
+    claimable = {"$or": [{"claimed_at": None}, {"claimed_at": {"$lt": expired}}]}
+    ids = [doc["_id"] for doc in db.analytics_queue.find(claimable, {"_id": 1}).sort("at", 1).limit(limit)]
+    if not ids:
+        return None
+    claim = ObjectId()
+    db.analytics_queue.update_many(
+        {"_id": {"$in": ids}, **claimable},
+        {"$set": {"claimed_at": now, "claim": claim}}
+    )
+    return claim
+
+def process_analytics_queue(db, limit=ANALYTICS_BATCH_SIZE, now=None):
+    """Claim up to `limit` queued changes and fold them into the buckets.
+
+    Changes are claimed as one batch with a lease, so several workers can
+    drain the queue at once without counting a change twice. They are
+    deleted only after the bucket writes succeed; a batch whose worker failed
+    is claimed again once its lease runs out. Returns how many were claimed.
+    """
+    claim = claim_changes(db, now or datetime.utcnow(), limit)
+    if claim is None:
+        return 0
+    changes = list(db.analytics_queue.find({"claim": claim}))
+
+    daily, areas, contractors = {}, {}, {}
+    for change in changes:
+        day, area, daily_inc, area_inc, contractor_incs = bucket_increments(change)
+        if daily_inc:
+            merge_inc(daily, day, daily_inc)
+        if area and area_inc:
+            merge_inc(areas, (day, area), area_inc)
+        for contractor_id, inc in contractor_incs.items():
+            merge_inc(contractors, contractor_id, inc)
+
+    if daily:
+        db.analytics_daily.bulk_write([
+            UpdateOne({"_id": day}, {"$inc": inc}, upsert=True)
+            for day, inc in daily.items()
+        ], ordered=False)
+    if areas:
+        db.analytics_areas.bulk_write([
+            UpdateOne({"_id": f"{day}|{area}"},
+                      {"$inc": inc, "$setOnInsert": {"day": day, "area": area}}, upsert=True)
+            for (day, area), inc in areas.items()
+        ], ordered=False)
+    if contractors:
+        db.analytics_contractors.bulk_write([
+            UpdateOne({"_id": contractor_id}, {"$inc": inc}, upsert=True)
+            for contractor_id, inc in contractors.items()
+        ], ordered=False)
+
+    db.analytics_queue.delete_many({"claim": claim})
+    return len(changes)
+
+def analytics_worker(interval):
+    db = get_db_connection()
+    while True:
+        try:
+            # Keep draining while full batches come back
+            while process_analytics_queue(db) == ANALYTICS_BATCH_SIZE:
+                pass
+        except Exception:
+            # Unfinished batches stay queued and are claimed again
+            logger.exception("Analytics job failed")
+        time.sleep(interval)
+
+_worker_started = False
+
+def start_analytics_worker(interval=ANALYTICS_INTERVAL):
+    global _worker_started
+    if _worker_started or os.getenv('ANALYTICS_WORKER', '1') == '0':
+        return
+    _worker_started = True
+    threading.Thread(target=analytics_worker, args=(interval,), daemon=True).start()
+
+def rebuild_analytics(db):
+    """Recompute every bucket from grievances and the archive (one-off backfill)."""
+    db.analytics_queue.delete_many({})
+    for name in ('analytics_daily', 'analytics_areas', 'analytics_contractors'):
+        db[name].delete_many({})
+
+    grievances = chain(db.grievances.find({}, ANALYTICS_FIELDS), db.grievances_archive.find({}, ANALYTICS_FIELDS))
+    for grievance in grievances:
+        submitted_at = grievance.get("submitted_at")
+        if not submitted_at:
+            continue
+        base = {k: grievance.get(k) for k in ("submitted_at", "latitude", "longitude")}
+        steps = [(submitted_at, None, dict(base, status=PENDING))]
+        state = dict(steps[0][2])
+
+        if grievance.get("assigned_at"):
+            after = {"status": IN_PROGRESS, "contractor_id": grievance.get("contractor_id"),
+                     "assigned_at": grievance["assigned_at"]}
+            steps.append((grievance["assigned_at"], dict(state), after))
+            state.update(after)
+        if grievance.get("completed_at"):
+            after = {"status": RESOLVED, "completed_at": grievance["completed_at"]}
+            steps.append((grievance["completed_at"], dict(state), after))
+            state.update(after)
+        if state.get("status") != grievance.get("status"):
+            steps.append((grievance.get("completed_at") or grievance.get("assigned_at") or submitted_at,
+                          dict(state), {"status": grievance.get("status")}))
+
+        for at, before, after in steps:
+            db.analytics_queue.insert_one({"at": at, "before": before, "after": after})
+
+    while process_analytics_queue(db):
+        pass
+
+# --- READ API ---
+
+def requested_days(default=30, maximum=366):
+    try:
+        days = int(request.args.get('days', default))
+    except ValueError:
+        days = default
+    return max(1, min(days, maximum))
+
+def daily_buckets(db, days):
+    start = day_key(datetime.utcnow() - timedelta(days=days - 1))
+    return list(db.analytics_daily.find({"_id": {"$gte": start}}).sort("_id", 1))
+
+def group_by_period(buckets, bucket):
+    if bucket != 'week':
+        return [(doc["_id"], doc) for doc in buckets]
+
+    weeks = {}
+    for doc in buckets:
+        merged = weeks.setdefault(week_key(doc["_id"]), {})
+        for field in ("opened", "closed"):
+            merged[field] = merged.get(field, 0) + doc.get(field, 0)
+        for status, count in doc.get("status", {}).items():
+            merged.setdefault("status", {})
+            merged["status"][status] = merged["status"].get(status, 0) + count
+        for stage, totals in doc.get("durations", {}).items():
+            merged.setdefault("durations", {}).setdefault(stage, {"sum": 0, "count": 0})
+            merged["durations"][stage]["sum"] += totals.get("sum", 0)
+            merged["durations"][stage]["count"] += totals.get("count", 0)
+    return sorted(weeks.items())
+
+def mean_hours(totals):
+    if not totals or not totals.get("count"):
+        return None
+    return round(totals["sum"] / totals["count"] / 3600, 2)
+
+# Grievances opened and closed per day or week, with status transitions
+@analytics_api.route('/api/analytics/volume', methods=['GET'])
+@require_role('admin', api=True)
+def volume():
+    db = with_policy(get_db_connection(), "analytics")
+    bucket = request.args.get('bucket', 'day')
+    periods = group_by_period(daily_buckets(db, requested_days()), bucket)
+
+    return jsonify({
+        'bucket': bucket,
+        'series': [
+            {
+                'period': period,
+                'opened': doc.get('opened', 0),
+                'closed': doc.get('closed', 0),
+                'by_status': doc.get('status', {})
+            }
+            for period, doc in periods
+        ]
+    })
+
+# Mean time spent in each stage of the grievance lifecycle, in hours
+@analytics_api.route('/api/analytics/resolution', methods=['GET'])
+@require_role('admin', api=True)
+def resolution():
+    db = with_policy(get_db_connection(), "analytics")
+    bucket = request.args.get('bucket', 'day')
+    periods = group_by_period(daily_buckets(db, requested_days()), bucket)
+
+    overall = {}
+    series = []
+    for period, doc in periods:
+        durations = doc.get('durations', {})
+        series.append({
+            'period': period,
+            **{stage: mean_hours(durations.get(stage)) for stage in ('assign', 'work', 'verify', 'resolve')}
+        })
+        for stage, totals in durations.items():
+            overall.setdefault(stage, {"sum": 0, "count": 0})
+            overall[stage]["sum"] += totals.get("sum", 0)
+            overall[stage]["count"] += totals.get("count", 0)
+
+    return jsonify({
+        'bucket': bucket,
+        'overall': {stage: mean_hours(overall.get(stage)) for stage in ('assign', 'work', 'verify', 'resolve')},
+        'series': series
+    })
+
+# Grievances opened and closed per area cell
+@analytics_api.route('/api/analytics/areas', methods=['GET'])
+@require_role('admin', api=True)
+def areas():
+    db = with_policy(get_db_connection(), "analytics")
+    start = day_key(datetime.utcnow() - timedelta(days=requested_days() - 1))
+    pipeline = [
+        {"$match": {"day": {"$gte": start}}},
+        {"$group": {"_id": "$area", "opened": {"$sum": "$opened"}, "closed": {"$sum": "$closed"}}},
+        {"$sort": {"opened": -1}},
+        {"$limit": 50}
+    ]
+
+    return jsonify({
+        'cell_degrees': AREA_CELL_DEGREES,
+        'areas': [
+            {'area': doc['_id'], 'opened': doc['opened'], 'closed': doc['closed'],
+             'open': doc['opened'] - doc['closed']}
+            for doc in db.analytics_areas.aggregate(pipeline)
+        ]
+    })
+
+# Open work per contractor, by status
+@analytics_api.route('/api/analytics/contractors', methods=['GET'])
+@require_role('admin', api=True)
+def contractor_backlog():
+    db = with_policy(get_db_connection(), "analytics")
+    backlogs = list(db.analytics_contractors.find())
+    names = {
+        c['_id']: c['username']
+        for c in db.contractors.find({"_id": {"$in": [b['_id'] for b in backlogs]}}, {"username": 1})
+    }
+
+    result = []
+    for doc in backlogs:
+        backlog = {status: count for status, count in doc.get('backlog', {}).items() if count}
+        result.append({
+            'contractor_id': str(doc['_id']),
+            'username': names.get(doc['_id']),
+            'backlog': backlog,
+            'open': sum(count for status, count in backlog.items() if status != COMPLETED)
+        })
+    result.sort(key=lambda item: item['open'], reverse=True)
+
+    return jsonify({'contractors': result})
+
+if __name__ == '__main__':
+    print("🔄 Rebuilding analytics buckets from grievances and the archive...")
+    rebuild_analytics(get_db_connection())
+    print("✅ Analytics rebuilt")
@@ -0,0 +1,226 @@
+import os
+from datetime import datetime, date
+from flask import Blueprint, request, jsonify, session
+from flask.json.provider import DefaultJSONProvider
+from pymongo import MongoClient
+from bson import ObjectId
+from auth import require_role, current_identity
+from policies import with_policy
+from summaries import get_citizen_summary
+import dashboards
+from workflow import get_workload
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Versioned JSON API for the dashboards, for mobile clients and the chatbot widget
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+API_VERSION = 1
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Grievance fields a client may ask for with ?fields=
+GRIEVANCE_FIELDS = {
+    "location", "latitude", "longitude", "description", "phone", "photo_path", "photo_thumbnail_url", "status",
+    "submitted_at", "status_updated_at", "assigned_at", "completed_at", "verified_at", "verified_by",
+    "contractor_id", "user_id", "needs_verification", "revision_requested", "revision_requested_at",
+    "completion_proof_url", "completion_proof_thumbnail_url", "escalation"
+}
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def get_dashboard_db():
+    return with_policy(get_db_connection(), "dashboard")
+
+# --- SERIALIZATION ---
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON for Mongo documents: ObjectIds as strings, datetimes as ISO 8601.
+
+    Uses orjson when it is installed and the standard encoder otherwise.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs.get("indent"):
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if kwargs.get("sort_keys", self.sort_keys) else 0)
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        return super().dumps(obj, **kwargs)
+
+def renamed_id(doc):
+    """Expose Mongo's _id as id."""
+    doc = dict(doc)
+    if "_id" in doc:
+        doc["id"] = doc.pop("_id")
+    doc.pop("score", None)
+    return doc
+
+# --- REQUEST PARSING ---
+
+def requested_fields():
+    """Fields named in ?fields=a,b,c, or None for the default set. Unknown names are an error."""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    fields = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = fields - GRIEVANCE_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return sorted(fields)
+
+def requested_limit():
+    try:
+        return max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+def api_response(data, next_cursor=None):
+    return jsonify({"version": API_VERSION, "data": data, "next": next_cursor})
+
+def page_args():
+    """(fields, after, limit) for a list endpoint; raises ValueError on bad input."""
+    fields = requested_fields()
+    after = request.args.get('after')
+    if after and dashboards.decode_cursor(after) is None:
+        raise ValueError("Invalid cursor")
+    return fields, after, requested_limit()
+
+# --- ROUTES ---
+
+# Citizen dashboard: the citizen's grievances, newest first
+@api_v1.route('/citizen/dashboard', methods=['GET'])
+@require_role('citizen', api=True)
+def citizen_dashboard():
+    try:
+        fields, after, limit = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    db = get_dashboard_db()
+    data = dashboards.citizen_dashboard(db, current_identity()["id"], fields, after, limit)
+    result = {
+        "username": session.get('username'),
+        "grievances": [renamed_id(doc) for doc in data["grievances"]]
+    }
+    if after is None:
+        summary = get_citizen_summary(db, current_identity()["id"])
+        result["summary"] = {
+            "counts": summary["counts"],
+            "total": summary["total"],
+            "recent": [renamed_id(doc) for doc in summary["recent"]]
+        }
+    return api_response(result, data["next"])
+
+# Grievance tracking with the same status/date filters as /track-grievance
+@api_v1.route('/citizen/grievances', methods=['GET'])
+@require_role('citizen', api=True)
+def citizen_grievances():
+    try:
+        fields, after, limit = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = dashboards.citizen_grievances(
+        get_dashboard_db(), current_identity()["id"],
+        request.args.get('status', 'all'), request.args.get('date', 'all'),
+        fields, after, limit, archived=request.args.get('archived') == '1'
+    )
+    return api_response({"grievances": [renamed_id(doc) for doc in data["grievances"]]}, data["next"])
+
+# Issue manager: grievances, plus the verification queue, status counts and
+# contractors on the first page
+@api_v1.route('/admin/issues', methods=['GET'])
+@require_role('admin', api=True)
+def admin_issues():
+    try:
+        fields, after, limit = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = dashboards.admin_issues(
+        get_dashboard_db(),
+        request.args.get('status_filter', 'all'), request.args.get('q', '').strip(),
+        fields, after, limit, summary=after is None
+    )
+    result = {"grievances": [renamed_id(doc) for doc in data["grievances"]]}
+    if after is None:
+        result["resolved_tasks"] = [renamed_id(doc) for doc in data["resolved_tasks"]]
+        result["status_counts"] = data["status_counts"]
+        result["contractors"] = [
+            {"id": c["_id"], "username": c.get("username"), "services_provided": c.get("services_provided"),
+             "open_tasks": c.get("workload", {}).get("open", 0), "workload": get_workload(c)}
+            for c in data["contractors"]
+        ]
+    return api_response(result, data["next"])
+
+# Contractors ranked by a workload counter, for assignment decisions
+@api_v1.route('/admin/contractors', methods=['GET'])
+@require_role('admin', api=True)
+def contractor_leaderboard():
+    try:
+        contractors = dashboards.contractor_leaderboard(
+            get_dashboard_db(), request.args.get('sort', 'completed'), requested_limit()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return api_response({
+        "contractors": [
+            {"id": c["_id"], "username": c.get("username"), "services_provided": c.get("services_provided"),
+             "workload": c["workload"]}
+            for c in contractors
+        ]
+    })
+
+# Contractor dashboard: assigned tasks, plus revisions, completed tasks and
+# counts on the first page
+@api_v1.route('/contractor/dashboard', methods=['GET'])
+@require_role('contractor', api=True)
+def contractor_dashboard():
+    try:
+        fields, after, limit = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = dashboards.contractor_dashboard(
+        get_dashboard_db(), current_identity()["id"], request.args.get('status_filter', 'all'),
+        fields, after, limit, summary=after is None
+    )
+    result = {"tasks": [renamed_id(doc) for doc in data["tasks"]]}
+    if after is None:
+        result["revision_requests"] = [renamed_id(doc) for doc in data["revision_requests"]]
+        result["completed_tasks"] = [renamed_id(doc) for doc in data["completed_tasks"]]
+        result["counts"] = data["counts"]
+    return api_response(result, data["next"])
+
+# Citizen feedback with rating statistics
+@api_v1.route('/admin/feedback', methods=['GET'])
+@require_role('admin', api=True)
+def admin_feedback():
+    rating = request.args.get('rating', 'all')
+    if rating != 'all' and rating not in ('1', '2', '3', '4', '5'):
+        return jsonify({'error': 'rating must be 1-5 or all'}), 400
+    after = request.args.get('after')
+    if after and dashboards.decode_cursor(after) is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    data = dashboards.admin_feedback(
+        get_dashboard_db(), rating, request.args.get('date', 'all'), after, requested_limit()
+    )
+    stats = dict(data["stats"])
+    stats.pop("_id", None)
+    return api_response({
+        "feedback": [renamed_id(doc) for doc in data["feedback"]],
+        "stats": stats
+    }, data["next"])
@@ -1,19 +1,49 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import logging
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, send_from_directory
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
 from bot import chatbot_api
+from analytics import analytics_api, ensure_analytics_indexes, record_change, start_analytics_worker
+from maps import map_api, ensure_map_indexes, invalidate_tiles
+from geocode import geocode_api, ensure_geocode_indexes
+from search import search_api, ensure_search_indexes
+from events import events_api, ensure_events_indexes, log_event
+from sessions import init_sessions
+from auth import require_role
+from idempotency import idempotent, new_idempotency_key, ensure_idempotency_indexes
+from assets import init_assets
+from api import api_v1, MongoJSONProvider
+from repos import make_repos
+from media import media_api, save_upload, thumbnail_src
+from sla import sla_api, ensure_sla_indexes
+from scheduler import start_scheduler
+from notify import ensure_notify_indexes
+from archive import ensure_archive_indexes
+from summaries import get_citizen_summary, record_submission
+from limits import init_limits, body_limit
+from policies import policy_api, init_policies, with_policy
+import dashboards
+from assignment import assignment_api, ensure_assignment_indexes
+from workflow import (transition, transition_many, after_commit, explain_failure, status_change_fields,
+                      normalize_status, normalize_statuses, rebuild_workload, ensure_workflow_indexes,
+                      STATUSES, PENDING, IN_PROGRESS, RESOLVED, COMPLETED)
 
 # Load environment variables
 load_dotenv()
 
+# Module loggers share the format of Flask's own log lines
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
+)
+
 # Cloudinary configuration - Production ready with environment variables
 cloudinary.config( 
     cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),  
@@ -22,13 +52,111 @@ cloudinary.config(
 )
 
 app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', os.urandom(24))
+init_sessions(app)
+init_limits(app)
+init_policies(app)
+init_assets(app)
+app.json = MongoJSONProvider(app)
 app.register_blueprint(chatbot_api)
+app.register_blueprint(analytics_api)
+app.register_blueprint(map_api)
+app.register_blueprint(geocode_api)
+app.register_blueprint(assignment_api)
+app.register_blueprint(search_api)
+app.register_blueprint(events_api)
+app.register_blueprint(api_v1)
+app.register_blueprint(media_api)
+app.register_blueprint(sla_api)
+app.register_blueprint(policy_api)
+start_analytics_worker()
+start_scheduler()
+
+# Hidden idempotency_key fields for POST forms
+@app.context_processor
+def inject_idempotency_key():
+    return {"idempotency_key": new_idempotency_key}
+
+# List thumbnails for grievance photos and completion proofs
+app.jinja_env.globals.update(thumbnail_src=thumbnail_src)
 
 # MongoDB connection
+_indexes_ready = False
+
 def get_db():
+    global _indexes_ready
     client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
-    return client['urbanunity']
+    db = client['urbanunity']
+
+    # Create the indexes once per process, on first use
+    if not _indexes_ready:
+        _indexes_ready = True
+        try:
+            ensure_indexes(db)
+            normalize_statuses(db)
+        except Exception as e:
+            app.logger.error(f"Index creation failed: {e}")
+
+    return db
+
+# Citizens, contractors, grievances and feedback
+def get_repos():
+    return make_repos(get_db)
+
+# Parse the id list of a bulk request (form field or JSON "ids")
+def bulk_ids():
+    if request.is_json:
+        raw_ids = (request.get_json(silent=True) or {}).get('ids', [])
+    else:
+        raw_ids = request.form.getlist('ids')
+
+    ids, results = [], {}
+    for raw_id in raw_ids:
+        if ObjectId.is_valid(raw_id):
+            ids.append(ObjectId(raw_id))
+        else:
+            results[raw_id] = "invalid id"
+    return ids, results
+
+# Report per-item results of a bulk request, as JSON or a flash summary
+def bulk_response(action, ids, applied, results):
+    for oid in ids:
+        results[str(oid)] = "ok" if oid in applied else "skipped"
+
+    if request.is_json:
+        return jsonify({'action': action, 'applied': len(applied), 'results': results})
+
+    if applied:
+        flash(f"{action}: {len(applied)} grievance(s) updated.", "success")
+    failed = len(results) - len(applied)
+    if failed:
+        flash(f"{action}: {failed} grievance(s) skipped (already changed, not eligible or invalid).", "warning")
+    if not results:
+        flash("No grievances selected!", "warning")
+    return redirect(url_for('manage_issues'))
+
+# Indexes backing the admin and dashboard queries
+def ensure_indexes(db):
+    # Feedback list: rating filter + newest first, and unfiltered newest first
+    db.feedback.create_index([("rating", 1), ("submitted_at", -1), ("_id", -1)])
+    db.feedback.create_index([("submitted_at", -1), ("_id", -1)])
+    # Retried API submissions: one grievance per (citizen, idempotency key)
+    db.grievances.create_index(
+        [("user_id", 1), ("idempotency_key", 1)],
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$exists": True}}
+    )
+    ensure_analytics_indexes(db)
+    ensure_map_indexes(db)
+    ensure_geocode_indexes(db)
+    ensure_workflow_indexes(db)
+    ensure_assignment_indexes(db)
+    ensure_search_indexes(db)
+    ensure_events_indexes(db)
+    ensure_idempotency_indexes(db)
+    dashboards.ensure_dashboard_indexes(db)
+    ensure_sla_indexes(db)
+    ensure_notify_indexes(db)
+    ensure_archive_indexes(db)
 
 # Test database connection function
 def test_db_connection():
@@ -74,12 +202,9 @@ def citizen_login():
         if errors:
             return render_template('clogin3.html', username=username, errors=errors)
 
-        db = get_db()
-        citizens = db.citizens
-        
         try:
             # Check if the username exists
-            user = citizens.find_one({"username": username})
+            user = get_repos().citizens.find_by_username(username)
             
             if not user:
                 flash("Username not found. Please check your username or sign up.", "warning")
@@ -118,11 +243,10 @@ def signup():
         username = request.form['username']
         password = request.form['password']
 
-        db = get_db()
-        citizens = db.citizens
+        citizens = get_repos().citizens
         
         # Check if username already exists
-        existing_user = citizens.find_one({"username": username})
+        existing_user = citizens.find_by_username(username)
 
         if existing_user:
             return render_template('clogin2.html', error="Username already exists! Try another one.")
@@ -142,7 +266,7 @@ def signup():
                 "created_at": datetime.utcnow()
             }
             
-            citizens.insert_one(citizen_data)
+            citizens.create(citizen_data)
             flash("Signup successful! Please log in.", "success")
             return redirect(url_for('citizen_login'))
             
@@ -152,53 +276,28 @@ def signup():
     return render_template('clogin2.html')
 
 @app.route('/citizen-dashboard')
+@require_role('citizen')
 def cdashboard():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-    
     username = session['username']
     
-    db = get_db()
-    grievances = db.grievances
-    
-    # Fetch grievances of logged-in user
-    user_grievances = list(grievances.find({"user_id": ObjectId(session['user_id'])}))
+    # Counts and latest grievances from the citizen's summary; the full list is on /track-grievance
+    summary = get_citizen_summary(with_policy(get_db(), "dashboard"), g.identity["id"])
     
-    return render_template('cdashboard.html', username=username, grievances=user_grievances)
+    return render_template('cdashboard.html', username=username, summary=summary)
 
 @app.route('/track-grievance')
+@require_role('citizen')
 def track_grievance():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-    
     status_filter = request.args.get('status', 'all')
     date_filter = request.args.get('date', 'all')
+    # Grievances archived after completion are only listed on request
+    archived = request.args.get('archived') == '1'
     
-    db = get_db()
-    grievances = db.grievances
-    
-    # Build query
-    query = {"user_id": ObjectId(session['user_id'])}
-    
-    # Apply status filter
-    if status_filter != 'all':
-        query["status"] = status_filter
-    
-    # Apply date filter
-    if date_filter != 'all':
-        now = datetime.utcnow()
-        if date_filter == 'week':
-            query["submitted_at"] = {"$gte": now - timedelta(days=7)}
-        elif date_filter == 'month':
-            query["submitted_at"] = {"$gte": now - timedelta(days=30)}
-        elif date_filter == 'year':
-            query["submitted_at"] = {"$gte": now - timedelta(days=365)}
-    
-    user_grievances = list(grievances.find(query).sort("submitted_at", -1))
+    data = dashboards.citizen_grievances(
+        with_policy(get_db(), "dashboard"), g.identity["id"], status_filter, date_filter, archived=archived
+    )
     
-    return render_template('viewstatus.html', grievances=user_grievances)
+    return render_template('viewstatus.html', grievances=data["grievances"])
 
 # Admin Routes
 @app.route('/admin-login', methods=['GET', 'POST'])
@@ -242,175 +341,201 @@ def admin_login():
     return render_template('alogin.html')
 
 @app.route('/manage-issues')
+@require_role('admin')
 def manage_issues():
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-
     # Get filter parameters
     status_filter = request.args.get('status_filter', 'all')
+    search_text = request.args.get('q', '').strip()
 
-    db = get_db()
-    grievances = db.grievances
-    contractors = db.contractors
-
-    # Build query
-    query = {}
-    if status_filter != 'all':
-        query["status"] = status_filter
-    
-    # Get grievances
-    all_grievances = list(grievances.find(query))
-
-    # Get tasks that need verification
-    resolved_tasks = list(grievances.find({"status": "Resolved", "needs_verification": True}))
-
-    # Count grievances by status for pie chart
-    pipeline = [
-        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-    ]
-    status_counts = {item['_id']: item['count'] for item in grievances.aggregate(pipeline)}
-
-    # Fetch all contractors for dropdown
-    all_contractors = list(contractors.find())
+    data = dashboards.admin_issues(with_policy(get_db(), "dashboard"), status_filter, search_text)
 
     return render_template('manageissues.html', 
-                           grievances=all_grievances,
-                           Resolved_tasks=resolved_tasks,
-                           status_counts=status_counts, 
-                           contractors=all_contractors,
-                           status_filter=status_filter)
+                           grievances=data["grievances"],
+                           Resolved_tasks=data["resolved_tasks"],
+                           status_counts=data["status_counts"], 
+                           contractors=data["contractors"],
+                           status_filter=status_filter,
+                           search_text=search_text)
 
 @app.route('/assign_contractor', methods=['POST'])
+@require_role('admin')
+@idempotent
 def assign_contractor():
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-
     grievance_id = request.form.get('grievance_id')
     contractor_id = request.form.get('contractor_id')
 
-    print(f"DEBUG: Assigning contractor {contractor_id} to grievance {grievance_id}")
+    app.logger.debug(f"Assigning contractor {contractor_id} to grievance {grievance_id}")
 
     if grievance_id and contractor_id:
         db = get_db()
-        grievances = db.grievances
-        contractors = db.contractors
         
         # Verify contractor exists
-        contractor = contractors.find_one({"_id": ObjectId(contractor_id)})
+        contractor = get_repos().contractors.get(ObjectId(contractor_id))
         if not contractor:
             flash("Selected contractor not found!", "danger")
             return redirect(url_for('manage_issues'))
         
         # Update grievance with contractor assignment
-        result = grievances.update_one(
-            {"_id": ObjectId(grievance_id)},
-            {
-                "$set": {
-                    "contractor_id": ObjectId(contractor_id),
-                    "status": "In Progress",
-                    "assigned_at": datetime.utcnow()
-                }
-            }
+        previous = transition(
+            db, ObjectId(grievance_id), IN_PROGRESS, "assign", g.identity,
+            {"contractor_id": ObjectId(contractor_id), "assigned_at": datetime.utcnow()}
         )
         
-        if result.modified_count > 0:
+        if previous is not None:
             flash(f"Contractor '{contractor['username']}' assigned successfully! Status updated to In Progress.", "success")
         else:
-            flash("Failed to assign contractor. Please try again.", "danger")
+            flash(f"Failed to assign contractor. {explain_failure(db, ObjectId(grievance_id), IN_PROGRESS, g.identity)}", "danger")
     else:
         flash("Invalid grievance or contractor selection!", "danger")
 
     return redirect(url_for('manage_issues'))
 
 @app.route('/verify_task', methods=['POST'])
+@require_role('admin')
+@idempotent
 def verify_task():
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-        
     task_id = request.form.get('task_id')
     
     if task_id:
         db = get_db()
-        grievances = db.grievances
         
-        # Update task verification
-        result = grievances.update_one(
-            {"_id": ObjectId(task_id)},
+        # Only a task that is still Resolved can be verified
+        previous = transition(
+            db, ObjectId(task_id), COMPLETED, "verify", g.identity,
             {
-                "$set": {
-                    "needs_verification": False,
-                    "verified_by": ObjectId(session['admin_id']),
-                    "verified_at": datetime.utcnow(),
-                    "status": "completed"
-                }
+                "needs_verification": False,
+                "verified_by": g.identity["id"],
+                "verified_at": datetime.utcnow()
             }
         )
         
-        if result.modified_count > 0:
+        if previous is not None:
             flash("Task verified successfully!", "success")
         else:
-            flash("Failed to verify task. Please try again.", "danger")
+            flash(f"Failed to verify task. {explain_failure(db, ObjectId(task_id), COMPLETED, g.identity)}", "danger")
         
     return redirect(url_for('manage_issues'))
 
 @app.route('/request_revision', methods=['POST'])
+@require_role('admin')
+@idempotent
 def request_revision():
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-        
     task_id = request.form.get('task_id')
     
     if task_id:
         db = get_db()
-        grievances = db.grievances
         
         # Set the status back to "In Progress" and add a revision note
-        result = grievances.update_one(
-            {"_id": ObjectId(task_id)},
+        previous = transition(
+            db, ObjectId(task_id), IN_PROGRESS, "request_revision", g.identity,
             {
-                "$set": {
-                    "status": "In Progress",
-                    "revision_requested": True,
-                    "needs_verification": False,
-                    "revision_requested_at": datetime.utcnow()
-                }
-            }
+                "revision_requested": True,
+                "needs_verification": False,
+                "revision_requested_at": datetime.utcnow()
+            },
+            query={"status": RESOLVED}
         )
         
-        if result.modified_count > 0:
+        if previous is not None:
             flash("Revision requested. Task status changed to In Progress.", "warning")
         else:
-            flash("Failed to request revision. Please try again.", "danger")
+            flash(f"Failed to request revision. {explain_failure(db, ObjectId(task_id), IN_PROGRESS, g.identity, {'status': RESOLVED})}", "danger")
         
     return redirect(url_for('manage_issues'))
 
 @app.route('/update_status/<string:grievance_id>', methods=['POST'])
+@require_role('admin')
+@idempotent
 def update_status(grievance_id):
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-        
-    new_status = request.form.get('status')
+    new_status = normalize_status(request.form.get('status'))
     if new_status:
         db = get_db()
-        grievances = db.grievances
         
-        result = grievances.update_one(
-            {"_id": ObjectId(grievance_id)},
-            {"$set": {"status": new_status, "status_updated_at": datetime.utcnow()}}
+        previous = transition(
+            db, ObjectId(grievance_id), new_status, "update_status", g.identity,
+            status_change_fields(new_status, datetime.utcnow())
         )
         
-        if result.modified_count > 0:
+        if previous is not None:
             flash(f"Status updated to {new_status}!", "success")
         else:
-            flash("Failed to update status. Please try again.", "danger")
+            flash(f"Failed to update status. {explain_failure(db, ObjectId(grievance_id), new_status, g.identity)}", "danger")
+    elif request.form.get('status'):
+        flash(f"Unknown status! Use one of: {', '.join(STATUSES)}", "danger")
         
     return redirect(url_for('manage_issues'))
 
+# Bulk admin actions: one write and one page load for a whole selection
+@app.route('/bulk_assign', methods=['POST'])
+@require_role('admin')
+@idempotent
+def bulk_assign():
+    ids, results = bulk_ids()
+    contractor_id = request.form.get('contractor_id') or (request.get_json(silent=True) or {}).get('contractor_id')
+
+    db = get_db()
+    contractor = get_repos().contractors.get(ObjectId(contractor_id)) if ObjectId.is_valid(contractor_id or '') else None
+    if not contractor:
+        if request.is_json:
+            return jsonify({'error': 'Selected contractor not found'}), 400
+        flash("Selected contractor not found!", "danger")
+        return redirect(url_for('manage_issues'))
+
+    now = datetime.utcnow()
+    applied = transition_many(
+        db, [(oid, {"contractor_id": contractor["_id"], "assigned_at": now}) for oid in ids],
+        IN_PROGRESS, "assign", g.identity
+    )
+    return bulk_response(f"Assigned to {contractor['username']}", ids, applied, results)
+
+@app.route('/bulk_verify', methods=['POST'])
+@require_role('admin')
+@idempotent
+def bulk_verify():
+    ids, results = bulk_ids()
+    fields = {
+        "needs_verification": False,
+        "verified_by": g.identity["id"],
+        "verified_at": datetime.utcnow()
+    }
+    applied = transition_many(get_db(), [(oid, fields) for oid in ids], COMPLETED, "verify", g.identity)
+    return bulk_response("Verified", ids, applied, results)
+
+@app.route('/bulk_request_revision', methods=['POST'])
+@require_role('admin')
+@idempotent
+def bulk_request_revision():
+    ids, results = bulk_ids()
+    fields = {
+        "revision_requested": True,
+        "needs_verification": False,
+        "revision_requested_at": datetime.utcnow()
+    }
+    applied = transition_many(
+        get_db(), [(oid, fields) for oid in ids], IN_PROGRESS, "request_revision", g.identity,
+        query={"status": RESOLVED}
+    )
+    return bulk_response("Revision requested", ids, applied, results)
+
+@app.route('/bulk_update_status', methods=['POST'])
+@require_role('admin')
+@idempotent
+def bulk_update_status():
+    ids, results = bulk_ids()
+    new_status = normalize_status(request.form.get('status') or (request.get_json(silent=True) or {}).get('status'))
+    if not new_status:
+        if request.is_json:
+            return jsonify({'error': f"status must be one of: {', '.join(STATUSES)}"}), 400
+        flash("Please choose a status!", "danger")
+        return redirect(url_for('manage_issues'))
+
+    fields = status_change_fields(new_status, datetime.utcnow())
+    applied = transition_many(
+        get_db(), [(oid, fields) for oid in ids], new_status, "update_status", g.identity,
+        query={"status": {"$ne": new_status}}
+    )
+    return bulk_response(f"Status set to {new_status}", ids, applied, results)
+
 # Contractor Routes
 @app.route('/contractor-login', methods=['GET', 'POST'])
 def contractor_login():
@@ -430,12 +555,9 @@ def contractor_login():
         if errors:
             return render_template('blogin.html', username=username, errors=errors)
 
-        db = get_db()
-        contractors = db.contractors
-        
         try:
             # Check contractor exists
-            contractor = contractors.find_one({"username": username})
+            contractor = get_repos().contractors.find_by_username(username)
             
             if not contractor:
                 flash("Username not found.", "warning")
@@ -461,131 +583,81 @@ def contractor_login():
     return render_template('blogin.html', username=username, errors=errors)
 
 @app.route('/contractor-dashboard')
+@require_role('contractor')
 def contractor_dashboard():
-    if 'contractor_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('contractor_login'))
-    
     username = session['contractor_username']
-    contractor_id = ObjectId(session['contractor_id'])
     
     # Get filter parameters
     status_filter = request.args.get('status_filter', 'all')
     
-    db = get_db()
-    grievances = db.grievances
-    
-    # Build query for assigned tasks
-    query = {"contractor_id": contractor_id}
-    if status_filter != 'all':
-        query["status"] = status_filter
-        
-    # Get tasks
-    tasks = list(grievances.find(query))
-    
-    # Find tasks that need revision
-    revision_requests = list(grievances.find({
-        "contractor_id": contractor_id,
-        "status": "In Progress",
-        "revision_requested": True
-    }))
-    
-    # Count tasks by status
-    pipeline = [
-        {"$match": {"contractor_id": contractor_id}},
-        {
-            "$group": {
-                "_id": None,
-                "total": {"$sum": 1},
-                "in_progress": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "In Progress"]}, 1, 0]}
-                },
-                "pending_verification": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "Resolved"]}, 1, 0]}
-                },
-                "completed": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}
-                }
-            }
-        }
-    ]
-    
-    counts_result = list(grievances.aggregate(pipeline))
-    counts = counts_result[0] if counts_result else {
-        "total": 0, "in_progress": 0, "pending_verification": 0, "completed": 0
-    }
-    
-    # Get completed tasks
-    completed_tasks_list = list(grievances.find({
-        "contractor_id": contractor_id,
-        "status": "completed"
-    }))
+    data = dashboards.contractor_dashboard(with_policy(get_db(), "dashboard"), g.identity["id"], status_filter)
+    counts = data["counts"]
     
     return render_template('contractor.html', 
                           username=username, 
-                          tasks=tasks, 
-                          completed_tasks_list=completed_tasks_list,
-                          revision_requests=revision_requests,
+                          tasks=data["tasks"], 
+                          completed_tasks_list=data["completed_tasks"],
+                          revision_requests=data["revision_requests"],
                           assigned_tasks=counts['total'],
                           in_progress_tasks=counts['in_progress'],
                           pending_verification_tasks=counts['pending_verification'],
                           completed_tasks=counts['completed'],
                           status_filter=status_filter)
 
+# Text fields of a task status update; returns an error message or None
+def task_field_error(form):
+    if not form.get('task_id') or not normalize_status(form.get('status')):
+        return "Missing required data!"
+    return None
+
 @app.route('/update_task_status', methods=['POST'])
+@body_limit(validate=task_field_error)
+@require_role('contractor')
+@idempotent
 def update_task_status():
-    if 'contractor_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('contractor_login'))
-    
     task_id = request.form.get('task_id')
-    new_status = request.form.get('status')
+    new_status = normalize_status(request.form.get('status'))
     completion_proof = request.files.get('completion_proof')
 
-    if not task_id or not new_status:
-        flash("Missing required data!", "danger")
+    error = task_field_error(request.form)
+    if error:
+        flash(error, "danger")
         return redirect(url_for('contractor_dashboard'))
 
     db = get_db()
-    grievances = db.grievances
 
     try:
-        # Upload completion proof to Cloudinary if provided
-        proof_url = None
+        # Store the completion proof if provided
+        proof = None
         if completion_proof and completion_proof.filename:
-            upload_result = cloudinary.uploader.upload(completion_proof)
-            proof_url = upload_result['secure_url']
+            proof = save_upload(completion_proof)
 
-        if new_status == 'Resolved':
+        contractor_query = {"contractor_id": g.identity["id"]}
+        if new_status == RESOLVED:
             update_data = {
-                "status": "Resolved",
                 "needs_verification": True,
                 "revision_requested": False,
                 "completed_at": datetime.utcnow()
             }
-            if proof_url:
-                update_data["completion_proof_url"] = proof_url
-                
-            result = grievances.update_one(
-                {
-                    "_id": ObjectId(task_id),
-                    "contractor_id": ObjectId(session['contractor_id'])
-                },
-                {"$set": update_data}
-            )
+            if proof:
+                update_data["completion_proof_url"] = proof.url
+                update_data["completion_proof_thumbnail_url"] = proof.thumbnail_url
         else:
-            result = grievances.update_one(
-                {
-                    "_id": ObjectId(task_id),
-                    "contractor_id": ObjectId(session['contractor_id'])
-                },
-                {"$set": {"status": new_status, "status_updated_at": datetime.utcnow()}}
-            )
+            # Contractors can only take a task back from Resolved to In Progress
+            update_data = {"needs_verification": False}
+            contractor_query["status"] = RESOLVED
+
+        previous = transition(
+            db, ObjectId(task_id), new_status, "contractor_update", g.identity,
+            update_data, query=contractor_query
+        )
         
-        if result.modified_count > 0:
+        if previous is None:
+            flash(f"Failed to update task status. {explain_failure(db, ObjectId(task_id), new_status, g.identity, contractor_query)}", "danger")
+        elif new_status == RESOLVED:
             flash("Task marked as Resolved and sent for admin verification!", "success")
         else:
-            flash("Failed to update task status. Please try again.", "danger")
+            flash(f"Task moved back to {new_status}.", "success")
             
     except Exception as e:
         flash(f"Error updating task: {str(e)}", "danger")
@@ -594,36 +666,84 @@ def update_task_status():
 
 # Grievance Management Routes
 @app.route('/report-issue')
+@require_role('citizen')
 def report_issue():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-    
     return render_template('report1.html')
 
+# Insert a new grievance and update everything derived from it.
+# Returns (grievance_id, created); with an idempotency key, a repeated
+# submission returns the grievance the first one created.
+def create_grievance(db, user_id, phone, location, latitude, longitude, description, photo_url,
+                     idempotency_key=None, photo_thumbnail_url=None):
+    grievance_data = {
+        "user_id": user_id,
+        "location": location,
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "description": description,
+        "phone": phone,
+        "photo_path": photo_url,
+        "photo_thumbnail_url": photo_thumbnail_url,
+        "status": PENDING,
+        "submitted_at": datetime.utcnow(),
+        "needs_verification": False,
+        "revision_requested": False
+    }
+    if idempotency_key:
+        grievance_data["idempotency_key"] = idempotency_key
+
+    grievances = get_repos().grievances
+    try:
+        grievance_id = grievances.create(grievance_data)
+    except DuplicateKeyError:
+        existing = grievances.find_by_idempotency_key(user_id, idempotency_key, ["_id"])
+        return existing["_id"], False
+
+    after_commit(
+        f"submission of grievance {grievance_id}",
+        (record_change, db, None, grievance_data, grievance_data["submitted_at"]),
+        (record_submission, db, dict(grievance_data, _id=grievance_id)),
+        (invalidate_tiles, db, latitude, longitude),
+        (log_event, db, grievance_id, "submit", None, PENDING, {"role": "citizen", "id": user_id},
+         {key: value for key, value in grievance_data.items() if key not in ("_id", "idempotency_key")},
+         grievance_data["submitted_at"])
+    )
+    app.logger.debug(f"Grievance inserted with ID: {grievance_id}")
+    return grievance_id, True
+
+# Text fields of a grievance submission; returns an error message or None.
+# Upload routes run it before reading the photo (see limits.body_limit).
+def grievance_field_error(form):
+    if not all(form.get(field) for field in ('location', 'latitude', 'longitude', 'description')):
+        return "location, latitude, longitude and description are required"
+    try:
+        latitude, longitude = float(form.get('latitude')), float(form.get('longitude'))
+    except (TypeError, ValueError):
+        return "latitude and longitude must be numbers"
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return "latitude and longitude are out of range"
+    return None
+
 @app.route('/submit-grievance', methods=['POST'])
+@body_limit(validate=grievance_field_error)
+@require_role('citizen')
+@idempotent
 def submit_grievance():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-
-    user_id = ObjectId(session['user_id'])
+    user_id = g.identity["id"]
     location = request.form.get('location')
     latitude = request.form.get('latitude')
     longitude = request.form.get('longitude')
     description = request.form.get('description')
     photo = request.files.get('photo')
 
-    if not all([location, latitude, longitude, description]):
-        flash("All fields are required!", "danger")
+    error = grievance_field_error(request.form)
+    if error:
+        flash(f"Please check the form: {error}.", "danger")
         return redirect(url_for('report_issue'))
         
     # Fetch phone number from the citizen collection
     db = get_db()
-    citizens = db.citizens
-    grievances = db.grievances
-    
-    citizen = citizens.find_one({"_id": user_id})
+    citizen = get_repos().citizens.get(user_id)
     
     if not citizen:
         flash("Error retrieving user information!", "danger")
@@ -631,48 +751,91 @@ def submit_grievance():
         
     phone = citizen['phone_number']
 
-    # Upload image to Cloudinary
-    photo_url = None
+    # Store the photo
+    stored = None
     if photo and photo.filename:
         try:
-            upload_result = cloudinary.uploader.upload(photo)
-            photo_url = upload_result['secure_url']
+            stored = save_upload(photo)
         except Exception as e:
             flash(f"Error uploading image: {str(e)}", "danger")
 
     try:
-        grievance_data = {
-            "user_id": user_id,
-            "location": location,
-            "latitude": float(latitude),
-            "longitude": float(longitude),
-            "description": description,
-            "phone": phone,
-            "photo_path": photo_url,
-            "status": "pending",
-            "submitted_at": datetime.utcnow(),
-            "needs_verification": False,
-            "revision_requested": False
-        }
-        
-        result = grievances.insert_one(grievance_data)
-        print(f"DEBUG: Grievance inserted with ID: {result.inserted_id}")
+        create_grievance(
+            db, user_id, phone, location, latitude, longitude, description,
+            stored.url if stored else None, photo_thumbnail_url=stored.thumbnail_url if stored else None
+        )
         flash("Grievance submitted successfully!", "success")
         
     except Exception as err:
-        print(f"DEBUG: Error inserting grievance: {err}")
+        app.logger.exception(f"Error inserting grievance: {err}")
         flash(f"Database error: {err}", "danger")
 
     return redirect(url_for('cdashboard'))
 
+MAX_IDEMPOTENCY_KEY_LENGTH = 100
+
+# Grievance ingestion API (JSON or multipart) used by the offline submission queue.
+# Clients send an Idempotency-Key header so retried submissions are stored once.
+@app.route('/api/grievances', methods=['POST'])
+@body_limit(validate=grievance_field_error)
+@require_role('citizen', api=True)
+@idempotent
+def api_submit_grievance():
+    user_id = g.identity["id"]
+    data = (request.get_json(silent=True) or {}) if request.is_json else request.form
+    idempotency_key = (request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '').strip()
+    location = data.get('location')
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    description = data.get('description')
+    photo = request.files.get('photo')
+
+    if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({'error': f'An Idempotency-Key of at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters is required'}), 400
+    error = grievance_field_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    db = get_db()
+
+    # A retry of a submission that already went through: skip the upload entirely
+    existing = get_repos().grievances.find_by_idempotency_key(user_id, idempotency_key, ["status"])
+    if existing:
+        return jsonify({'id': str(existing['_id']), 'status': existing.get('status'), 'duplicate': True}), 200
+
+    citizen = get_repos().citizens.get(user_id, ["phone_number"])
+    if not citizen:
+        return jsonify({'error': 'Error retrieving user information'}), 404
+
+    stored = None
+    if photo and photo.filename:
+        try:
+            stored = save_upload(photo)
+        except Exception as e:
+            # Retryable: the queue keeps the submission and tries again later
+            return jsonify({'error': f'Error uploading image: {e}'}), 503
+
+    grievance_id, created = create_grievance(
+        db, user_id, citizen.get('phone_number'), location, latitude, longitude, description,
+        stored.url if stored else None, idempotency_key=idempotency_key,
+        photo_thumbnail_url=stored.thumbnail_url if stored else None
+    )
+    return jsonify({'id': str(grievance_id), 'status': PENDING, 'duplicate': not created}), 201 if created else 200
+
+# Service worker that queues grievance submissions while offline.
+# Served from the site root so its scope covers the report page.
+@app.route('/grievance-queue-sw.js')
+def grievance_queue_worker():
+    response = send_from_directory(app.static_folder, 'js/grievance-queue-sw.js', mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Feedback Routes
 @app.route('/submit-feedback', methods=['POST'])
+@require_role('citizen')
+@idempotent
 def submit_feedback():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-        
-    user_id = ObjectId(session['user_id'])
+    user_id = g.identity["id"]
     feedback_text = request.form.get('feedback_text')
     rating = request.form.get('rating')
     
@@ -692,7 +855,6 @@ def submit_feedback():
             return redirect(url_for('view_feedback'))
     
     db = get_db()
-    feedback = db.feedback
     
     try:
         feedback_data = {
@@ -702,7 +864,8 @@ def submit_feedback():
             "submitted_at": datetime.utcnow()
         }
         
-        feedback.insert_one(feedback_data)
+        get_repos().feedback.create(feedback_data)
+        dashboards.update_feedback_stats(db, rating)
         flash("Thank you for your feedback!", "success")
     except Exception as err:
         flash(f"Database error: {err}", "danger")
@@ -710,100 +873,34 @@ def submit_feedback():
     return redirect(url_for('cdashboard'))
 
 @app.route('/view-feedback')
+@require_role('citizen')
 def view_feedback():
-    if 'user_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('citizen_login'))
-    
     username = session['username']
     
     # Get user's past feedback
-    db = get_db()
-    feedback = db.feedback
-    
-    user_feedback = list(feedback.find(
-        {"user_id": ObjectId(session['user_id'])}
-    ).sort("submitted_at", -1))
+    user_feedback = get_repos().feedback.list_for_user(g.identity["id"])
     
     return render_template('feedback.html', username=username, user_feedback=user_feedback)
 
 # Admin view for all feedback
 @app.route('/admin-feedback')
+@require_role('admin')
 def admin_feedback():
-    if 'admin_id' not in session:
-        flash("Please log in first!", "warning")
-        return redirect(url_for('admin_login'))
-    
     # Get filter parameters
     rating_filter = request.args.get('rating', 'all')
     date_filter = request.args.get('date', 'all')
+    cursor = request.args.get('after')
     
-    db = get_db()
-    feedback = db.feedback
-    citizens = db.citizens
-    
-    # Build aggregation pipeline
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "citizens",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "citizen"
-            }
-        },
-        {"$unwind": "$citizen"}
-    ]
-    
-    # Apply filters
-    match_conditions = {}
-    if rating_filter != 'all':
-        match_conditions["rating"] = int(rating_filter)
-    
-    if date_filter != 'all':
-        now = datetime.utcnow()
-        if date_filter == 'today':
-            match_conditions["submitted_at"] = {"$gte": now.replace(hour=0, minute=0, second=0, microsecond=0)}
-        elif date_filter == 'week':
-            match_conditions["submitted_at"] = {"$gte": now - timedelta(days=7)}
-        elif date_filter == 'month':
-            match_conditions["submitted_at"] = {"$gte": now - timedelta(days=30)}
-    
-    if match_conditions:
-        pipeline.append({"$match": match_conditions})
-    
-    pipeline.append({"$sort": {"submitted_at": -1}})
-    
-    all_feedback = list(feedback.aggregate(pipeline))
-    
-    # Calculate statistics
-    stats_pipeline = [
-        {
-            "$group": {
-                "_id": None,
-                "total_count": {"$sum": 1},
-                "avg_rating": {"$avg": "$rating"},
-                "five_star": {"$sum": {"$cond": [{"$eq": ["$rating", 5]}, 1, 0]}},
-                "four_star": {"$sum": {"$cond": [{"$eq": ["$rating", 4]}, 1, 0]}},
-                "three_star": {"$sum": {"$cond": [{"$eq": ["$rating", 3]}, 1, 0]}},
-                "two_star": {"$sum": {"$cond": [{"$eq": ["$rating", 2]}, 1, 0]}},
-                "one_star": {"$sum": {"$cond": [{"$eq": ["$rating", 1]}, 1, 0]}}
-            }
-        }
-    ]
-    
-    stats_result = list(feedback.aggregate(stats_pipeline))
-    stats = stats_result[0] if stats_result else {
-        "total_count": 0, "avg_rating": 0, "five_star": 0,
-        "four_star": 0, "three_star": 0, "two_star": 0, "one_star": 0
-    }
+    data = dashboards.admin_feedback(with_policy(get_db(), "dashboard"), rating_filter, date_filter, cursor)
     
     return render_template(
         'feedbackview.html', 
-        all_feedback=all_feedback, 
-        stats=stats,
+        all_feedback=data["feedback"], 
+        stats=data["stats"],
         rating_filter=rating_filter,
-        date_filter=date_filter
+        date_filter=date_filter,
+        next_cursor=data["next"],
+        is_first_page=cursor is None
     )
 
 # Authentication Management
@@ -891,6 +988,9 @@ def init_db():
             result = contractors.insert_one(contractor)
             print(f"✅ Additional contractor created: {contractor['username']} / contractor123 (ID: {result.inserted_id})")
 
+    # Recount contractor workloads used by the assignment engine
+    rebuild_workload(db)
+
 if __name__ == '__main__':
     print("🚀 Starting Urban Unity Application...")
     
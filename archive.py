@@ -0,0 +1,90 @@
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import DeleteOne
+from pymongo.errors import BulkWriteError
+from scheduler import register_job
+from policies import with_policy
+from workflow import COMPLETED
+
+# Verified grievances are moved out of the hot grievances collection into
+# grievances_archive once they have been completed for ARCHIVE_AFTER_DAYS.
+# Archived documents keep their _id and fields (plus archived_at); list
+# queries leave them out unless asked to include the archive.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+
+# Sweep schedule and bounds: documents moved per batch and seconds per run
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_SWEEP_SECONDS = 20
+
+# Scheduler lease: comfortably longer than one bounded run
+ARCHIVE_LEASE_SECONDS = ARCHIVE_SWEEP_SECONDS * 3
+
+def ensure_archive_indexes(db):
+    # Completed grievances by the time they were completed
+    db.grievances.create_index([("status", 1), ("status_updated_at", 1)])
+    # Same list orders as the live collection
+    db.grievances_archive.create_index([("user_id", 1), ("submitted_at", -1), ("_id", -1)])
+    db.grievances_archive.create_index([("submitted_at", -1), ("_id", -1)])
+
+def archivable_query(cutoff):
+    """Grievances completed before cutoff; legacy rows without a status time go by submission."""
+    return {
+        "status": COMPLETED,
+        "$or": [
+            {"status_updated_at": {"$lt": cutoff}},
+            {"status_updated_at": None, "submitted_at": {"$lt": cutoff}}
+        ]
+    }
+
+def copy_to_archive(db, grievances, now):
+    docs = [dict(grievance, archived_at=now) for grievance in grievances]
+    try:
+        db.grievances_archive.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Copies left by an interrupted run are fine; anything else is not
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+def archive_batch(db, cutoff, now, limit=ARCHIVE_BATCH_SIZE):
+    """Move one batch to the archive; returns how many grievances moved."""
+    grievances = list(db.grievances.find(archivable_query(cutoff)).limit(limit))
+    if not grievances:
+        return 0
+
+    # Copy first, then delete only what is unchanged since it was read, so a
+    # grievance reopened in between stays live
+    copy_to_archive(db, grievances, now)
+    result = db.grievances.bulk_write([
+        DeleteOne({"_id": g["_id"], "status": COMPLETED, "status_updated_at": g.get("status_updated_at")})
+        for g in grievances
+    ], ordered=False)
+
+    if result.deleted_count < len(grievances):
+        ids = [g["_id"] for g in grievances]
+        still_live = [g["_id"] for g in db.grievances.find({"_id": {"$in": ids}}, {"_id": 1})]
+        if still_live:
+            db.grievances_archive.delete_many({"_id": {"$in": still_live}})
+    return result.deleted_count
+
+@register_job("archive", interval=ARCHIVE_INTERVAL, lease=ARCHIVE_LEASE_SECONDS)
+def archive_completed(db, now=None, days=ARCHIVE_AFTER_DAYS, budget=ARCHIVE_SWEEP_SECONDS):
+    """Move grievances completed more than `days` ago to grievances_archive.
+
+    Each run stops after `budget` seconds; the next run continues.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    # A copy must not be lost to a failover before its original is deleted
+    db = with_policy(db, "transition")
+    deadline = time.monotonic() + budget
+    moved, complete = 0, False
+    while time.monotonic() < deadline:
+        count = archive_batch(db, cutoff, now)
+        moved += count
+        if count < ARCHIVE_BATCH_SIZE:
+            complete = True
+            break
+    return {"archived": moved, "complete": complete}
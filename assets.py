@@ -0,0 +1,175 @@
+"""Jinja bytecode caching, static asset fingerprinting and responsive WebP variants.
+
+Run `python assets.py` as a build step. It copies every CSS/JS file under
+static/ to static/dist/ with a content hash in its name, writes WebP
+variants of the banner images at a few widths, and records everything in
+static/dist/manifest.json. Templates link assets through asset_url(),
+webp_source() and webp_background(); without a build they fall back to the plain static files.
+"""
+import hashlib
+import json
+import os
+import shutil
+from flask import url_for, request
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Directories whose files are fingerprinted
+ASSET_DIRS = ['css', 'js']
+
+# Large images shown full-width, and the widths generated for them
+BANNER_IMAGES = [
+    'images/Banner.png', 'images/cbanner.jpg', 'images/gbanner.jpg', 'images/road.jpg',
+    'images/image1.png', 'images/image2.png', 'images/image3.png',
+    'images/e1.jpg', 'images/e2.jpg', 'images/e3.jpg',
+    'images/beach cleaning.jpg', 'images/road_drill.jpg', 'images/traffic_light.jpg', 'images/map.jpg'
+]
+WEBP_WIDTHS = [480, 960, 1600]
+WEBP_QUALITY = 80
+
+# Hashed files never change, so browsers may keep them for a year
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+STATIC_CACHE = 'public, max-age=3600'
+
+# Served from a fixed URL by its own route (/grievance-queue-sw.js)
+NO_FINGERPRINT = {'js/grievance-queue-sw.js'}
+
+def file_hash(path, length=10):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+def hashed_name(relative_path, digest, suffix=None):
+    stem, ext = os.path.splitext(relative_path)
+    return f"{stem}{suffix or ''}.{digest}{ext}"
+
+# --- BUILD ---
+
+def fingerprint_files():
+    files = {}
+    for directory in ASSET_DIRS:
+        root = os.path.join(STATIC_DIR, directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                source = os.path.join(dirpath, filename)
+                relative = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+                if relative in NO_FINGERPRINT:
+                    continue
+                target = hashed_name(relative, file_hash(source))
+                os.makedirs(os.path.dirname(os.path.join(DIST_DIR, target)), exist_ok=True)
+                shutil.copyfile(source, os.path.join(DIST_DIR, target))
+                files[relative] = 'dist/' + target
+    return files
+
+def build_webp_variants():
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Pillow is not installed; skipping WebP variants")
+        return {}
+
+    variants = {}
+    for relative in BANNER_IMAGES:
+        source = os.path.join(STATIC_DIR, relative)
+        if not os.path.exists(source):
+            continue
+        digest = file_hash(source)
+        with Image.open(source) as image:
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            widths = [width for width in WEBP_WIDTHS if width < image.width] + [min(image.width, WEBP_WIDTHS[-1])]
+            entries = []
+            for width in sorted(set(widths)):
+                height = round(image.height * width / image.width)
+                target = hashed_name(os.path.splitext(relative)[0] + '.webp', digest, f"-{width}w")
+                target_path = os.path.join(DIST_DIR, target)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                if not os.path.exists(target_path):
+                    image.resize((width, height), Image.LANCZOS).save(target_path, 'WEBP', quality=WEBP_QUALITY)
+                entries.append([width, 'dist/' + target])
+        variants[relative] = entries
+    return variants
+
+def build():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {"files": fingerprint_files(), "webp": build_webp_variants()}
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Fingerprinted {len(manifest['files'])} files, WebP variants for {len(manifest['webp'])} images")
+
+# --- RUNTIME ---
+
+_manifest = None
+_dev_hashes = {}
+
+def load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {"files": {}, "webp": {}}
+    return _manifest
+
+def asset_url(path):
+    """URL of a static file, fingerprinted so it can be cached forever."""
+    hashed = load_manifest()["files"].get(path)
+    if hashed:
+        return url_for('static', filename=hashed)
+
+    # No build: version the plain file by its content hash instead
+    if path not in _dev_hashes:
+        try:
+            _dev_hashes[path] = file_hash(os.path.join(STATIC_DIR, path))
+        except OSError:
+            _dev_hashes[path] = None
+    return url_for('static', filename=path, v=_dev_hashes[path]) if _dev_hashes[path] else url_for('static', filename=path)
+
+def webp_srcset(path):
+    """srcset of the WebP variants of an image, or '' when none were built."""
+    return ', '.join(
+        f"{url_for('static', filename=variant)} {width}w"
+        for width, variant in load_manifest()["webp"].get(path, [])
+    )
+
+def webp_source(path, sizes='100vw'):
+    """A <picture> <source> offering the WebP variants of an image, if built."""
+    srcset = webp_srcset(path)
+    if not srcset:
+        return ''
+    return Markup('<source type="image/webp" srcset="{}" sizes="{}">').format(srcset, sizes)
+
+def webp_background(path):
+    """A CSS background-image declaration preferring the largest WebP variant, if built."""
+    variants = load_manifest()["webp"].get(path)
+    if not variants:
+        return ''
+    fallback_type = 'image/png' if path.lower().endswith('.png') else 'image/jpeg'
+    return Markup('background-image: image-set(url("{}") type("image/webp"), url("{}") type("{}"));').format(
+        url_for('static', filename=variants[-1][1]), url_for('static', filename=path), fallback_type
+    )
+
+def init_assets(app):
+    # Compiled templates are kept on disk, so workers and restarts skip recompiling.
+    # Jinja's default directory is per user and checked for ownership and mode.
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
+    app.jinja_env.globals.update(asset_url=asset_url, webp_source=webp_source, webp_background=webp_background)
+
+    @app.after_request
+    def static_cache_headers(response):
+        if request.endpoint == 'static' and response.status_code == 200:
+            fingerprinted = request.path.startswith('/static/dist/') or 'v' in request.args
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE if fingerprinted else STATIC_CACHE
+        return response
+
+if __name__ == '__main__':
+    build()
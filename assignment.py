@@ -0,0 +1,196 @@
+import math
+import os
+import re
+from flask import Blueprint, jsonify, redirect, url_for, flash
+from pymongo import MongoClient
+from datetime import datetime, timedelta
+from workflow import transition_many, backfill_workloads, PENDING, IN_PROGRESS, COMPLETED
+from auth import require_role, current_identity
+from idempotency import idempotent
+
+# Create a Blueprint for automatic contractor assignment
+assignment_api = Blueprint('assignment_api', __name__)
+
+# Keywords that place a grievance or a contractor service in a category
+CATEGORY_KEYWORDS = {
+    "roads": ["road", "roads", "pothole", "potholes", "pavement", "footpath", "highway", "bridge", "tar"],
+    "water": ["water", "pipe", "pipeline", "leak", "leakage", "supply", "tap", "sewage", "drain", "drainage", "flood"],
+    "electrical": ["electric", "electrical", "power", "wire", "wiring", "transformer", "outage", "shock"],
+    "lighting": ["light", "lights", "lighting", "streetlight", "streetlights", "lamp", "bulb"],
+    "waste": ["waste", "garbage", "trash", "litter", "dump", "dumping", "rubbish", "bin"],
+    "cleaning": ["clean", "cleaning", "dirty", "sweep", "sweeping", "beach", "dust"]
+}
+
+# Scoring weights: specialty match dominates, then workload, then distance
+MATCH_WEIGHT = 10.0
+LOAD_WEIGHT = 1.0
+DISTANCE_WEIGHT = 0.2  # per km
+
+# A contractor is not given more open tasks than this
+MAX_OPEN_TASKS = int(os.getenv('MAX_OPEN_TASKS', 15))
+
+# Days a grievance may wait before it breaches its SLA
+SLA_DAYS = int(os.getenv('SLA_DAYS', 7))
+
+# How many pending grievances one batch considers
+BATCH_LIMIT = 1000
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_assignment_indexes(db):
+    db.grievances.create_index([("status", 1), ("submitted_at", 1)])
+    db.grievances.create_index([("contractor_id", 1), ("status", 1)])
+
+# --- MATCHING ---
+
+def tokenize(text):
+    return set(re.findall(r"[a-z]+", (text or "").lower()))
+
+def categorize(text):
+    """Return {category: number of matching keywords} for a piece of text."""
+    words = tokenize(text)
+    matches = {}
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        hits = len(words.intersection(keywords))
+        if hits:
+            matches[category] = hits
+    return matches
+
+def distance_km(lat1, lng1, lat2, lng2):
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.sqrt(x * x + y * y) * 6371
+
+def load_contractors(db):
+    """Contractors with their categories, open task count and a home position.
+
+    The position is the contractor's base_latitude/base_longitude if set,
+    otherwise the centre of their open tasks (one indexed aggregation for all).
+    """
+    pipeline = [
+        {"$match": {"contractor_id": {"$ne": None}, "status": {"$ne": COMPLETED}}},
+        {"$group": {"_id": "$contractor_id", "lat": {"$avg": "$latitude"}, "lng": {"$avg": "$longitude"}}}
+    ]
+    centres = {doc["_id"]: doc for doc in db.grievances.aggregate(pipeline)}
+
+    backfill_workloads(db)
+    contractors = []
+    for c in db.contractors.find({}, {"username": 1, "services_provided": 1, "workload": 1,
+                                      "base_latitude": 1, "base_longitude": 1}):
+        centre = centres.get(c["_id"], {})
+        contractors.append({
+            "_id": c["_id"],
+            "username": c["username"],
+            "categories": set(categorize(c.get("services_provided"))),
+            "open": (c.get("workload") or {}).get("open", 0),
+            "lat": c.get("base_latitude", centre.get("lat")),
+            "lng": c.get("base_longitude", centre.get("lng"))
+        })
+    return contractors
+
+def score(grievance, categories, contractor):
+    match = sum(hits for category, hits in categories.items() if category in contractor["categories"])
+    if not match:
+        return None
+
+    value = MATCH_WEIGHT * match - LOAD_WEIGHT * contractor["open"]
+    if contractor["lat"] is not None and grievance.get("latitude") is not None:
+        value -= DISTANCE_WEIGHT * distance_km(grievance["latitude"], grievance["longitude"],
+                                               contractor["lat"], contractor["lng"])
+    return value
+
+def plan_assignments(db, limit=BATCH_LIMIT):
+    """Match pending, unassigned grievances to contractors.
+
+    Grievances are taken oldest first so the ones closest to their SLA are
+    served first; each takes the best-scoring contractor with spare capacity,
+    and that contractor's load is bumped before the next grievance is scored.
+    """
+    contractors = load_contractors(db)
+    deadline = datetime.utcnow() - timedelta(days=SLA_DAYS)
+    pending = db.grievances.find(
+        {"status": PENDING, "contractor_id": None},
+        {"description": 1, "location": 1, "latitude": 1, "longitude": 1, "submitted_at": 1}
+    ).sort("submitted_at", 1).limit(limit)
+
+    plan, unmatched = [], []
+    for grievance in pending:
+        categories = categorize(f"{grievance.get('description')} {grievance.get('location')}")
+        best, best_score = None, None
+        for contractor in contractors:
+            if contractor["open"] >= MAX_OPEN_TASKS:
+                continue
+            value = score(grievance, categories, contractor)
+            if value is not None and (best_score is None or value > best_score):
+                best, best_score = contractor, value
+
+        overdue = bool(grievance.get("submitted_at") and grievance["submitted_at"] < deadline)
+        if best is None:
+            unmatched.append({"grievance_id": grievance["_id"], "overdue": overdue})
+            continue
+
+        best["open"] += 1
+        plan.append({
+            "grievance": grievance,
+            "grievance_id": grievance["_id"],
+            "contractor_id": best["_id"],
+            "contractor": best["username"],
+            "categories": sorted(categories),
+            "overdue": overdue
+        })
+
+    return plan, unmatched
+
+def apply_assignments(db, plan, actor):
+    """Write a plan as one conditional bulk transition.
+
+    Only grievances that are still pending and unassigned are taken, so a
+    manual assignment made meanwhile is never overwritten.
+    """
+    now = datetime.utcnow()
+    taken = transition_many(
+        db,
+        [(item["grievance_id"], {"contractor_id": item["contractor_id"], "assigned_at": now}) for item in plan],
+        IN_PROGRESS, "auto_assign", actor,
+        query={"status": PENDING, "contractor_id": None}
+    )
+    return [item for item in plan if item["grievance_id"] in taken]
+
+# --- ROUTES ---
+
+# Preview what the engine would assign, without writing anything
+@assignment_api.route('/api/assignment/preview', methods=['GET'])
+@require_role('admin', api=True)
+def preview_assignments():
+    plan, unmatched = plan_assignments(get_db_connection())
+    return jsonify({
+        'assignments': [
+            {'grievance_id': str(item['grievance_id']), 'contractor_id': str(item['contractor_id']),
+             'contractor': item['contractor'], 'categories': item['categories'], 'overdue': item['overdue']}
+            for item in plan
+        ],
+        'unmatched': [
+            {'grievance_id': str(item['grievance_id']), 'overdue': item['overdue']}
+            for item in unmatched
+        ]
+    })
+
+# One-click bulk assignment of every pending grievance
+@assignment_api.route('/auto_assign', methods=['POST'])
+@require_role('admin')
+@idempotent
+def auto_assign():
+    db = get_db_connection()
+    plan, unmatched = plan_assignments(db)
+    applied = apply_assignments(db, plan, current_identity())
+
+    if applied:
+        flash(f"Auto-assigned {len(applied)} grievance(s) to contractors.", "success")
+    else:
+        flash("No pending grievances could be auto-assigned.", "warning")
+    if unmatched:
+        flash(f"{len(unmatched)} grievance(s) had no contractor with a matching specialty or free capacity.", "info")
+
+    return redirect(url_for('manage_issues'))
@@ -0,0 +1,75 @@
+import os
+import time
+from functools import wraps
+from flask import g, session, flash, redirect, url_for, jsonify
+from pymongo import MongoClient
+from bson import ObjectId
+from sessions import session_identity
+
+# Where each role's account lives and where it logs in
+ROLE_COLLECTIONS = {"citizen": "citizens", "admin": "government", "contractor": "contractors"}
+LOGIN_ENDPOINTS = {"citizen": "citizen_login", "admin": "admin_login", "contractor": "contractor_login"}
+ALL_ROLES = ("citizen", "admin", "contractor")
+
+# How long an account that was found is trusted without asking the database again.
+# The app never deletes accounts; one removed in the database directly keeps its
+# sessions working for at most this long.
+ACCOUNT_CACHE_TTL = int(os.getenv('ACCOUNT_CACHE_TTL', 60))
+
+# (role, account id) -> monotonic time the entry expires
+_account_cache = {}
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def current_identity():
+    """The logged-in role and account ObjectId, resolved once per request and kept on g."""
+    if 'identity' not in g:
+        role, raw_id = session_identity(session)
+        if role and ObjectId.is_valid(raw_id):
+            g.identity = {"role": role, "id": ObjectId(raw_id)}
+        else:
+            g.identity = {"role": None, "id": None}
+    return g.identity
+
+def account_exists(role, account_id):
+    """Whether the account is still in the database, cached for ACCOUNT_CACHE_TTL seconds."""
+    key = (role, account_id)
+    now = time.monotonic()
+    if _account_cache.get(key, 0) > now:
+        return True
+
+    db = get_db_connection()
+    if db[ROLE_COLLECTIONS[role]].find_one({"_id": account_id}, {"_id": 1}) is None:
+        _account_cache.pop(key, None)
+        return False
+
+    _account_cache[key] = now + ACCOUNT_CACHE_TTL
+    return True
+
+def require_role(*roles, api=False, verify=True):
+    """Only let the given roles through.
+
+    Page routes flash and redirect to the first role's login page; API
+    routes (api=True) answer 401 JSON. With verify, a session whose account
+    has since been deleted is cleared.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            identity = current_identity()
+            allowed = identity["role"] in roles
+            if allowed and verify and not account_exists(identity["role"], identity["id"]):
+                session.clear()
+                g.identity = {"role": None, "id": None}
+                allowed = False
+
+            if not allowed:
+                if api:
+                    return jsonify({'error': 'Not logged in'}), 401
+                flash("Please log in first!", "warning")
+                return redirect(url_for(LOGIN_ENDPOINTS[roles[0]]))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,8 +1,12 @@
 import json
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from pymongo import MongoClient
 from bson import ObjectId
 from datetime import datetime
+from auth import require_role, current_identity
+from repos import make_repos
+from policies import with_policy
+from summaries import get_citizen_summary
 import os
 
 # Create a Blueprint for the chatbot API
@@ -13,6 +17,10 @@ def get_db_connection():
     client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
     return client['urbanunity']
 
+# Chatbot lookups are read-only and may be served by a secondary
+def get_chatbot_db():
+    return with_policy(get_db_connection(), "chatbot")
+
 # Route to handle chatbot messages
 @chatbot_api.route('/api/chat', methods=['POST'])
 def chat():
@@ -20,18 +28,8 @@ def chat():
     user_message = data.get('message', '').lower()
     
     # Check if user is logged in and what type of user they are
-    user_type = None
-    user_id = None
-    
-    if 'user_id' in session:
-        user_type = 'citizen'
-        user_id = session['user_id']
-    elif 'admin_id' in session:
-        user_type = 'admin'
-        user_id = session['admin_id']
-    elif 'contractor_id' in session:
-        user_type = 'contractor'
-        user_id = session['contractor_id']
+    identity = current_identity()
+    user_type, user_id = identity["role"], identity["id"]
     
     # Process the message and generate a response
     response = process_message(user_message, user_type, user_id)
@@ -229,14 +227,8 @@ def process_message(message, user_type, user_id):
             grievance_id = message
             
             # Get grievance details
-            db = get_db_connection()
-            grievances = db.grievances
-            
             try:
-                grievance = grievances.find_one({
-                    "_id": ObjectId(grievance_id),
-                    "user_id": ObjectId(user_id)
-                })
+                grievance = make_repos(get_chatbot_db).grievances.get(ObjectId(grievance_id), user_id=user_id, archived=True)
                 
                 if grievance:
                     return {
@@ -362,23 +354,14 @@ def process_message(message, user_type, user_id):
 
 # Route to fetch grievance statistics for visualization
 @chatbot_api.route('/api/grievance_stats', methods=['GET'])
+@require_role('citizen', api=True)
 def grievance_stats():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
-    
-    user_id = session['user_id']
-    
-    db = get_db_connection()
-    grievances = db.grievances
+    user_id = current_identity()["id"]
     
     try:
         # Get status counts for user's grievances
-        pipeline = [
-            {"$match": {"user_id": ObjectId(user_id)}},
-            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-        ]
-        
-        status_counts = list(grievances.aggregate(pipeline))
+        counts = get_citizen_summary(get_chatbot_db(), user_id)["counts"]
+        status_counts = [{"_id": status, "count": count} for status, count in counts.items()]
         
         return jsonify({
             'status_counts': status_counts
@@ -0,0 +1,296 @@
+from bson import ObjectId
+from datetime import datetime, timedelta
+from workflow import IN_PROGRESS, RESOLVED, COMPLETED, get_workload, backfill_workloads
+
+# Query code shared by the HTML dashboards in app.py and the JSON API in api.py.
+# List queries take an optional projection, keyset cursor and page size; the
+# HTML views pass none of them and get every row, newest first.
+
+# Grievance fields that are internal bookkeeping, never shown
+HIDDEN_GRIEVANCE_FIELDS = {"history": 0, "batch_id": 0, "idempotency_key": 0}
+
+FEEDBACK_PAGE_SIZE = 20
+
+NEWEST_FIRST = [("submitted_at", -1), ("_id", -1)]
+
+def ensure_dashboard_indexes(db):
+    db.grievances.create_index([("user_id", 1), ("submitted_at", -1), ("_id", -1)])
+    db.grievances.create_index([("submitted_at", -1), ("_id", -1)])
+
+# --- KEYSET PAGINATION ---
+
+# Keyset cursor helpers: "<submitted_at isoformat>_<ObjectId>"
+def encode_cursor(doc):
+    return f"{doc['submitted_at'].isoformat()}_{doc['_id']}"
+
+def decode_cursor(cursor):
+    try:
+        timestamp, oid = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), ObjectId(oid)
+    except Exception:
+        return None
+
+def after_position(query, cursor):
+    """Restrict a newest-first query to rows strictly after the cursor."""
+    position = decode_cursor(cursor) if cursor else None
+    if not position:
+        return query
+    last_submitted_at, last_id = position
+    return {"$and": [query, {"$or": [
+        {"submitted_at": {"$lt": last_submitted_at}},
+        {"submitted_at": last_submitted_at, "_id": {"$lt": last_id}}
+    ]}]}
+
+def split_page(rows, limit):
+    """Trim a limit+1 result to one page and return it with the next cursor."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+def grievance_projection(fields=None):
+    if fields:
+        return dict({field: 1 for field in fields}, submitted_at=1)
+    return HIDDEN_GRIEVANCE_FIELDS
+
+def list_grievances(db, query, fields=None, after=None, limit=None, archived=False):
+    """Newest-first grievances matching query, one page at a time when limit is set.
+
+    With archived, grievances_archive is searched too and both are merged
+    into one list.
+    """
+    collections = [db.grievances, db.grievances_archive] if archived else [db.grievances]
+    rows = []
+    for collection in collections:
+        cursor = collection.find(after_position(query, after), grievance_projection(fields)).sort(NEWEST_FIRST)
+        if limit is not None:
+            cursor = cursor.limit(limit + 1)
+        rows.extend(cursor)
+    if archived:
+        rows.sort(key=lambda doc: (doc.get("submitted_at") or datetime.min, doc["_id"]), reverse=True)
+    return split_page(rows, limit)
+
+def date_cutoff(date_filter, now=None):
+    now = now or datetime.utcnow()
+    if date_filter == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = {"week": 7, "month": 30, "year": 365}.get(date_filter)
+    return now - timedelta(days=days) if days else None
+
+# --- CITIZEN ---
+
+def citizen_dashboard(db, user_id, fields=None, after=None, limit=None):
+    grievances, next_cursor = list_grievances(db, {"user_id": user_id}, fields, after, limit)
+    return {"grievances": grievances, "next": next_cursor}
+
+def citizen_grievances(db, user_id, status_filter='all', date_filter='all', fields=None, after=None, limit=None,
+                       archived=False):
+    query = {"user_id": user_id}
+    if status_filter != 'all':
+        query["status"] = status_filter
+    cutoff = date_cutoff(date_filter) if date_filter != 'today' else None
+    if cutoff:
+        query["submitted_at"] = {"$gte": cutoff}
+
+    grievances, next_cursor = list_grievances(db, query, fields, after, limit, archived)
+    return {"grievances": grievances, "next": next_cursor}
+
+# --- ADMIN ---
+
+def admin_issues(db, status_filter='all', search_text='', fields=None, after=None, limit=None, summary=True):
+    """Grievances for the issue manager, plus (with summary) the verification
+    queue, status counts and contractor list shown alongside them."""
+    query = {}
+    if status_filter != 'all':
+        query["status"] = status_filter
+
+    # Best text matches first when searching; ranked results are not paged by cursor
+    if search_text:
+        query["$text"] = {"$search": search_text}
+        projection = dict(grievance_projection(fields), score={"$meta": "textScore"})
+        cursor = db.grievances.find(query, projection).sort([("score", {"$meta": "textScore"})])
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        grievances, next_cursor = list(cursor), None
+    else:
+        grievances, next_cursor = list_grievances(db, query, fields, after, limit)
+
+    result = {"grievances": grievances, "next": next_cursor}
+    if summary:
+        # Tasks that need verification
+        result["resolved_tasks"] = list(db.grievances.find(
+            {"status": RESOLVED, "needs_verification": True}, grievance_projection(fields)
+        ))
+
+        # Count grievances by status for the pie chart
+        pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        result["status_counts"] = {item['_id']: item['count'] for item in db.grievances.aggregate(pipeline)}
+        archived = db.grievances_archive.estimated_document_count()
+        if archived:
+            # Everything in the archive is completed
+            result["status_counts"][COMPLETED] = result["status_counts"].get(COMPLETED, 0) + archived
+
+        # Contractors for the assignment dropdown, least loaded first
+        backfill_workloads(db)
+        result["contractors"] = list(db.contractors.find({}, {"password": 0}).sort("workload.open", 1))
+    return result
+
+# --- CONTRACTOR ---
+
+def contractor_dashboard(db, contractor_id, status_filter='all', fields=None, after=None, limit=None, summary=True):
+    query = {"contractor_id": contractor_id}
+    if status_filter != 'all':
+        query["status"] = status_filter
+
+    tasks, next_cursor = list_grievances(db, query, fields, after, limit)
+    result = {"tasks": tasks, "next": next_cursor}
+    if not summary:
+        return result
+
+    projection = grievance_projection(fields)
+
+    # Tasks that need revision
+    result["revision_requests"] = list(db.grievances.find({
+        "contractor_id": contractor_id,
+        "status": IN_PROGRESS,
+        "revision_requested": True
+    }, projection))
+
+    # Task counts from the contractor's workload counters
+    backfill_workloads(db)
+    contractor = db.contractors.find_one({"_id": contractor_id}, {"workload": 1}) or {}
+    workload = get_workload(contractor)
+    result["counts"] = {
+        "total": workload["open"] + workload["completed"],
+        "in_progress": workload["in_progress"],
+        "pending_verification": workload["pending_verification"],
+        "completed": workload["completed"]
+    }
+
+    # Completed tasks
+    result["completed_tasks"] = list(db.grievances.find({
+        "contractor_id": contractor_id,
+        "status": COMPLETED
+    }, projection))
+    return result
+
+# Leaderboard sort keys and their direction, each backed by an index on the counter
+LEADERBOARD_SORTS = {
+    "completed": -1,
+    "avg_resolution_hours": 1,
+    "open": 1,
+    "in_progress": 1,
+    "pending_verification": 1,
+    "revisions": 1
+}
+
+def contractor_leaderboard(db, sort="completed", limit=None):
+    """Contractors ordered by one workload counter; raises ValueError for an unknown one."""
+    if sort not in LEADERBOARD_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(LEADERBOARD_SORTS)}")
+    field = f"workload.{sort}"
+    backfill_workloads(db)
+    # Nobody has an average before completing something
+    query = {field: {"$gte": 0}} if sort == "avg_resolution_hours" else {}
+    cursor = db.contractors.find(query, {"username": 1, "services_provided": 1, "workload": 1}).sort(
+        field, LEADERBOARD_SORTS[sort]
+    )
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    return [dict(contractor, workload=get_workload(contractor)) for contractor in cursor]
+
+# --- FEEDBACK ---
+
+# Feedback statistics rollup
+FEEDBACK_STATS_ID = "global"
+STAR_FIELDS = {5: "five_star", 4: "four_star", 3: "three_star", 2: "two_star", 1: "one_star"}
+
+def update_feedback_stats(db, rating):
+    # Only increment an existing rollup; a missing one is rebuilt on the next read
+    inc = {"total_count": 1}
+    if rating:
+        inc["rated_count"] = 1
+        inc["rating_sum"] = rating
+        inc[STAR_FIELDS[rating]] = 1
+    db.feedback_stats.update_one({"_id": FEEDBACK_STATS_ID}, {"$inc": inc})
+
+def rebuild_feedback_stats(db):
+    pipeline = [
+        {
+            "$group": {
+                "_id": None,
+                "total_count": {"$sum": 1},
+                "rated_count": {"$sum": {"$cond": [{"$isNumber": "$rating"}, 1, 0]}},
+                "rating_sum": {"$sum": "$rating"},
+                "five_star": {"$sum": {"$cond": [{"$eq": ["$rating", 5]}, 1, 0]}},
+                "four_star": {"$sum": {"$cond": [{"$eq": ["$rating", 4]}, 1, 0]}},
+                "three_star": {"$sum": {"$cond": [{"$eq": ["$rating", 3]}, 1, 0]}},
+                "two_star": {"$sum": {"$cond": [{"$eq": ["$rating", 2]}, 1, 0]}},
+                "one_star": {"$sum": {"$cond": [{"$eq": ["$rating", 1]}, 1, 0]}}
+            }
+        }
+    ]
+
+    result = list(db.feedback.aggregate(pipeline))
+    stats = result[0] if result else {
+        "total_count": 0, "rated_count": 0, "rating_sum": 0, "five_star": 0,
+        "four_star": 0, "three_star": 0, "two_star": 0, "one_star": 0
+    }
+    stats["_id"] = FEEDBACK_STATS_ID
+
+    db.feedback_stats.replace_one({"_id": FEEDBACK_STATS_ID}, stats, upsert=True)
+    return stats
+
+def get_feedback_stats(db):
+    stats = db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID})
+    if stats is None:
+        stats = rebuild_feedback_stats(db)
+
+    rated_count = stats.get("rated_count", 0)
+    stats["avg_rating"] = stats.get("rating_sum", 0) / rated_count if rated_count else 0
+    return stats
+
+def admin_feedback(db, rating_filter='all', date_filter='all', after=None, limit=FEEDBACK_PAGE_SIZE):
+    # Apply filters first so they run against the (rating, submitted_at) index
+    match_conditions = {}
+    if rating_filter != 'all':
+        match_conditions["rating"] = int(rating_filter)
+
+    cutoff = date_cutoff(date_filter) if date_filter in ('today', 'week', 'month') else None
+    if cutoff:
+        match_conditions["submitted_at"] = {"$gte": cutoff}
+
+    # Keyset pagination: continue strictly after the last row of the previous page.
+    # The lookup only touches the rows of this page.
+    pipeline = [
+        {"$match": after_position(match_conditions, after)},
+        {"$sort": {"submitted_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {
+            "$lookup": {
+                "from": "citizens",
+                "localField": "user_id",
+                "foreignField": "_id",
+                "pipeline": [
+                    {"$project": {"_id": 0, "first_name": 1, "last_name": 1, "username": 1}}
+                ],
+                "as": "citizen"
+            }
+        },
+        {"$unwind": {"path": "$citizen", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "feedback_text": 1,
+                "rating": 1,
+                "submitted_at": 1,
+                "first_name": "$citizen.first_name",
+                "last_name": "$citizen.last_name",
+                "username": "$citizen.username"
+            }
+        }
+    ]
+
+    feedback, next_cursor = split_page(list(db.feedback.aggregate(pipeline)), limit)
+
+    # Statistics come from the maintained rollup instead of a full $group
+    return {"feedback": feedback, "stats": get_feedback_stats(db), "next": next_cursor}
@@ -0,0 +1,95 @@
+import os
+from flask import Blueprint, jsonify
+from pymongo import MongoClient
+from bson import ObjectId
+from auth import require_role, current_identity, ALL_ROLES
+
+# Create a Blueprint for the grievance event log API
+events_api = Blueprint('events_api', __name__)
+
+# Bookkeeping fields that don't belong in an event's change set
+EVENT_SKIP_FIELDS = {"status", "status_updated_at", "batch_id"}
+
+# Upper bound on events returned for one grievance
+TIMELINE_LIMIT = 500
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_events_indexes(db):
+    db.grievance_events.create_index([("grievance_id", 1), ("ts", 1)])
+
+def make_event(grievance_id, action, from_status, to_status, actor, changes, ts):
+    return {
+        "grievance_id": grievance_id,
+        "ts": ts,
+        "action": action,
+        "from": from_status,
+        "to": to_status,
+        "by": actor.get("id"),
+        "role": actor.get("role"),
+        "changes": {k: v for k, v in changes.items() if k not in EVENT_SKIP_FIELDS}
+    }
+
+def log_events(db, events):
+    """Append events to the grievance_events log. Events are never updated."""
+    if not events:
+        return
+    db.grievance_events.insert_many(events, ordered=False)
+
+def log_event(db, grievance_id, action, from_status, to_status, actor, changes, ts):
+    log_events(db, [make_event(grievance_id, action, from_status, to_status, actor, changes, ts)])
+
+def timeline(db, grievance_id):
+    """A grievance's full history, read with one range scan on (grievance_id, ts)."""
+    return list(
+        db.grievance_events.find({"grievance_id": grievance_id}, {"grievance_id": 0})
+        .sort("ts", 1)
+        .limit(TIMELINE_LIMIT)
+    )
+
+def serialize_event(event):
+    changes = {
+        key: str(value) if isinstance(value, ObjectId) else
+             value.isoformat() if hasattr(value, 'isoformat') else value
+        for key, value in event.get("changes", {}).items()
+    }
+    return {
+        'ts': event['ts'].isoformat(),
+        'action': event.get('action'),
+        'from': event.get('from'),
+        'to': event.get('to'),
+        'role': event.get('role'),
+        'by': str(event['by']) if event.get('by') else None,
+        'changes': changes
+    }
+
+# Route to fetch the history of one grievance
+@events_api.route('/api/grievances/<string:grievance_id>/timeline', methods=['GET'])
+@require_role(*ALL_ROLES, api=True)
+def grievance_timeline(grievance_id):
+    if not ObjectId.is_valid(grievance_id):
+        return jsonify({'error': 'Invalid grievance ID'}), 400
+
+    # Citizens see their own grievances, contractors the ones assigned to them
+    identity = current_identity()
+    query = {"_id": ObjectId(grievance_id)}
+    if identity["role"] == 'citizen':
+        query["user_id"] = identity["id"]
+    elif identity["role"] == 'contractor':
+        query["contractor_id"] = identity["id"]
+
+    db = get_db_connection()
+    grievance = db.grievances.find_one(query, {"status": 1})
+    if grievance is None:
+        # Archived grievances keep their history
+        grievance = db.grievances_archive.find_one(query, {"status": 1})
+    if grievance is None:
+        return jsonify({'error': 'Grievance not found'}), 404
+
+    return jsonify({
+        'grievance_id': grievance_id,
+        'status': grievance.get('status'),
+        'events': [serialize_event(event) for event in timeline(db, ObjectId(grievance_id))]
+    })
@@ -0,0 +1,262 @@
+import csv
+import logging
+import math
+import os
+import requests
+from flask import Blueprint, request, jsonify
+from pymongo import MongoClient
+from datetime import datetime
+from auth import require_role, ALL_ROLES
+
+logger = logging.getLogger(__name__)
+
+# Create a Blueprint for the geocoding API
+geocode_api = Blueprint('geocode_api', __name__)
+
+# Reverse lookups within the same ~150m geohash cell share one cache entry
+GEOHASH_PRECISION = 7
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+
+# Upstream provider: "nominatim" (default) or "stub" for offline use and tests
+GEOCODER = os.getenv('GEOCODER', 'nominatim')
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+UPSTREAM_TIMEOUT = 5
+
+# Optional CSV of known places (columns: name, latitude, longitude)
+GAZETTEER_PATH = os.getenv('GEOCODE_GAZETTEER')
+GAZETTEER_MAX_DISTANCE_M = 300
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_geocode_indexes(db):
+    db.geocode_cache.create_index("cached_at", expireAfterSeconds=GEOCODE_CACHE_TTL)
+
+# --- GEOHASH ---
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+
+    while len(geohash) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits, bit_count = 0, 0
+
+    return ''.join(geohash)
+
+def geohash_bounds(geohash):
+    """(south, west, north, east) of a geohash cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+def geohash_neighbours(geohash):
+    """The cell and the (up to) eight cells around it."""
+    south, west, north, east = geohash_bounds(geohash)
+    height, width = north - south, east - west
+    lat, lng = (south + north) / 2, (west + east) / 2
+    cells = []
+    for dlat in (-height, 0, height):
+        if not -90 < lat + dlat < 90:
+            continue
+        for dlng in (-width, 0, width):
+            cell = geohash_encode(lat + dlat, (lng + dlng + 180) % 360 - 180, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+def distance_m(lat1, lng1, lat2, lng2):
+    # Equirectangular approximation, accurate enough at gazetteer distances
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.sqrt(x * x + y * y) * 6371000
+
+# --- LOCAL GAZETTEER ---
+
+_gazetteer = None
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """Load the gazetteer once, bucketed by 5-character geohash (~5km cells)."""
+    global _gazetteer
+    if _gazetteer is not None:
+        return _gazetteer
+
+    _gazetteer = {"cells": {}, "names": {}}
+    if not path or not os.path.exists(path):
+        return _gazetteer
+
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                place = {
+                    "display_name": row["name"].strip(),
+                    "lat": float(row["latitude"]),
+                    "lon": float(row["longitude"])
+                }
+            except (KeyError, ValueError):
+                continue
+            cell = geohash_encode(place["lat"], place["lon"], 5)
+            _gazetteer["cells"].setdefault(cell, []).append(place)
+            _gazetteer["names"][place["display_name"].lower()] = place
+
+    logger.info("Loaded %d gazetteer places from %s", len(_gazetteer["names"]), path)
+    return _gazetteer
+
+def gazetteer_reverse(latitude, longitude):
+    # A place near the edge of the point's cell may sit in the next one
+    cells = load_gazetteer()["cells"]
+    places = [
+        place
+        for cell in geohash_neighbours(geohash_encode(latitude, longitude, 5))
+        for place in cells.get(cell, [])
+    ]
+    best, best_distance = None, GAZETTEER_MAX_DISTANCE_M
+    for place in places:
+        d = distance_m(latitude, longitude, place["lat"], place["lon"])
+        if d <= best_distance:
+            best, best_distance = place, d
+    return best
+
+def gazetteer_search(query):
+    names = load_gazetteer()["names"]
+    if query in names:
+        return names[query]
+    for name, place in names.items():
+        if query in name:
+            return place
+    return None
+
+# --- UPSTREAM PROVIDERS ---
+
+class UpstreamError(Exception):
+    """The upstream geocoder answered with something that is not a result."""
+
+def nominatim_get(path, params):
+    response = requests.get(
+        f"{NOMINATIM_URL}/{path}",
+        params=dict(params, format='json'),
+        headers={'User-Agent': 'UrbanUnity/1.0'},
+        timeout=UPSTREAM_TIMEOUT
+    )
+    response.raise_for_status()
+    try:
+        return response.json()
+    except ValueError:
+        raise UpstreamError(f"{path} returned a non-JSON response")
+
+def nominatim_place(data):
+    try:
+        return {"display_name": data['display_name'], "lat": float(data['lat']), "lon": float(data['lon'])}
+    except (KeyError, TypeError, ValueError):
+        raise UpstreamError("unexpected response format")
+
+def upstream_reverse(latitude, longitude):
+    if GEOCODER == 'stub':
+        return {"display_name": f"Lat: {latitude:.5f}, Lng: {longitude:.5f}", "lat": latitude, "lon": longitude}
+
+    data = nominatim_get('reverse', {'lat': latitude, 'lon': longitude})
+    if not data or 'display_name' not in data:
+        return None
+    return nominatim_place(data)
+
+def upstream_search(query):
+    if GEOCODER == 'stub':
+        return None
+
+    data = nominatim_get('search', {'q': query, 'limit': 1})
+    if not data:
+        return None
+    return nominatim_place(data[0])
+
+# --- CACHED LOOKUPS ---
+
+def cached_lookup(db, key, resolve_local, resolve_upstream):
+    cached = db.geocode_cache.find_one({"_id": key})
+    if cached:
+        return cached["result"], "cache"
+
+    result = resolve_local()
+    if result:
+        return result, "gazetteer"
+
+    result = resolve_upstream()
+    # Misses are cached too, so unknown spots don't hit the upstream every time
+    db.geocode_cache.replace_one(
+        {"_id": key},
+        {"result": result, "cached_at": datetime.utcnow()},
+        upsert=True
+    )
+    return result, "upstream"
+
+def reverse_geocode(db, latitude, longitude):
+    key = f"r:{geohash_encode(latitude, longitude)}"
+    return cached_lookup(
+        db, key,
+        lambda: gazetteer_reverse(latitude, longitude),
+        lambda: upstream_reverse(latitude, longitude)
+    )
+
+def search_geocode(db, query):
+    query = ' '.join(query.lower().split())
+    return cached_lookup(
+        db, f"s:{query}",
+        lambda: gazetteer_search(query),
+        lambda: upstream_search(query)
+    )
+
+# Route to resolve coordinates to an address (lat/lon) or an address to coordinates (q)
+@geocode_api.route('/api/geocode', methods=['GET'])
+@require_role(*ALL_ROLES, api=True)
+def geocode():
+    query = request.args.get('q', '').strip()
+    db = get_db_connection()
+
+    if query and len(query) < 5:
+        return jsonify({'error': 'Query must be at least 5 characters'}), 400
+    if not query:
+        try:
+            latitude = float(request.args['lat'])
+            longitude = float(request.args['lon'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'Provide q, or numeric lat and lon'}), 400
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return jsonify({'error': 'Provide q, or numeric lat and lon'}), 400
+
+    try:
+        if query:
+            result, source = search_geocode(db, query)
+        else:
+            result, source = reverse_geocode(db, latitude, longitude)
+    except requests.RequestException as e:
+        return jsonify({'error': f'Geocoding service unavailable: {e}'}), 503
+    except UpstreamError as e:
+        return jsonify({'error': f'Geocoding service returned an invalid response: {e}'}), 502
+
+    if not result:
+        return jsonify({'error': 'Location not found', 'source': source}), 404
+
+    return jsonify(dict(result, source=source))
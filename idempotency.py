@@ -0,0 +1,101 @@
+import os
+import time
+import uuid
+from functools import wraps
+from datetime import datetime
+from flask import request, make_response
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from auth import current_identity
+
+# How long a key is remembered; repeats after this run the request again
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+
+# How long a repeat waits for the first request to finish before giving up
+IDEMPOTENCY_WAIT = 5.0
+POLL_INTERVAL = 0.1
+
+# Responses larger than this are not stored (the key still blocks repeats)
+MAX_STORED_BODY = 64 * 1024
+
+# Response headers worth replaying
+REPLAY_HEADERS = ("Content-Type", "Location")
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_idempotency_indexes(db):
+    db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL)
+
+def new_idempotency_key():
+    """A fresh key for a rendered form's hidden idempotency_key field."""
+    return uuid.uuid4().hex
+
+def request_key():
+    key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    return key.strip()[:100] if key else None
+
+def replay(record):
+    response = make_response(record["body"], record["status"])
+    for name, value in record.get("headers", {}).items():
+        response.headers[name] = value
+    response.headers['Idempotent-Replay'] = 'true'
+    return response
+
+def wait_for_response(db, key_id):
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    while time.monotonic() < deadline:
+        record = db.idempotency_keys.find_one({"_id": key_id})
+        if record is None or record.get("state") == "done":
+            return record
+        time.sleep(POLL_INTERVAL)
+    return None
+
+def idempotent(view):
+    """Run a POST view at most once per Idempotency-Key.
+
+    The key comes from the Idempotency-Key header or a hidden
+    idempotency_key form field, and is scoped to the logged-in account and
+    the endpoint. The first request claims the key with an insert on the
+    unique _id; repeats wait for it to finish and get its stored response
+    back. Requests without a key run as before.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request_key()
+        if not key:
+            return view(*args, **kwargs)
+
+        identity = current_identity()
+        key_id = f"{identity['role']}:{identity['id']}:{request.endpoint}:{key}"
+        db = get_db_connection()
+
+        try:
+            db.idempotency_keys.insert_one({"_id": key_id, "state": "pending", "created_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            record = wait_for_response(db, key_id)
+            if record is None:
+                return make_response({'error': 'This request is still being processed'}, 409)
+            if record.get("state") == "done" and "body" in record:
+                return replay(record)
+            return make_response({'error': 'This request was already processed'}, 409)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.idempotency_keys.delete_one({"_id": key_id})
+            raise
+
+        # Server errors are not final: free the key so a retry can run
+        if response.status_code >= 500:
+            db.idempotency_keys.delete_one({"_id": key_id})
+            return response
+
+        result = {"state": "done", "status": response.status_code}
+        if not response.is_streamed and response.content_length is not None and response.content_length <= MAX_STORED_BODY:
+            result["body"] = response.get_data()
+            result["headers"] = {name: response.headers[name] for name in REPLAY_HEADERS if name in response.headers}
+        db.idempotency_keys.update_one({"_id": key_id}, {"$set": result})
+        return response
+    return wrapper
@@ -0,0 +1,198 @@
+"""Request body limits for uploads, enforced before the body is read.
+
+Every request is capped by MAX_CONTENT_LENGTH; routes decorated with
+@body_limit get their own cap, and a request whose Content-Length is over
+it is answered 413 before a byte of the body is read. Multipart bodies are
+parsed as a stream: the text fields that come before a file part are
+validated as soon as the file part starts, and the file's first bytes
+must look like an allowed image, so an invalid or abusive upload is
+rejected without spooling the file.
+"""
+import os
+from flask import Request, request, jsonify, flash, redirect
+from werkzeug.datastructures import FileStorage, Headers
+from werkzeug.exceptions import HTTPException, BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.formparser import FormDataParser, default_stream_factory
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+# Default cap for every request body, and for uploads on @body_limit routes
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+
+# Largest single text field in a form
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+# Bytes of a file part inspected to recognise its type
+SNIFF_BYTES = 16
+
+# endpoint -> {"max_bytes": int, "validate": function(fields) -> error or None, "images": bool}
+BODY_RULES = {}
+
+def body_limit(max_bytes=MAX_UPLOAD_BYTES, validate=None, images=True):
+    """Cap the route's request body at max_bytes.
+
+    `validate(fields)` gets the text fields sent before the first file part
+    and returns an error message to reject the request with, or None; forms
+    posting to the route must put those fields before their file inputs. With
+    `images`, file parts must start like a JPEG, PNG, GIF, WebP or HEIC image.
+    """
+    def decorator(view):
+        BODY_RULES[view.__name__] = {"max_bytes": max_bytes, "validate": validate, "images": images}
+        return view
+    return decorator
+
+def sniff_image_type(head):
+    """MIME type of an image from its first bytes, or None."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'heic', b'heix', b'mif1', b'msf1', b'hevc'):
+        return 'image/heic'
+    return None
+
+# --- PARSING ---
+
+class CheckedMultiPartParser:
+    """Streaming multipart parser that applies a route's BODY_RULES entry."""
+
+    def __init__(self, rule, stream_factory, max_form_parts=None, cls=None):
+        self.rule = rule
+        self.stream_factory = stream_factory
+        self.max_form_parts = max_form_parts
+        self.cls = cls
+
+    def before_file(self, fields):
+        validate = self.rule.get("validate")
+        error = validate(self.cls(fields)) if validate else None
+        if error:
+            raise BadRequest(error)
+
+    def parse(self, stream, boundary, content_length):
+        # The decoder's own memory cap counts file data too; text fields are capped below instead
+        decoder = MultipartDecoder(boundary, max_form_memory_size=None, max_parts=self.max_form_parts)
+        fields, files = [], []
+        part, chunks, size, container, head = None, [], 0, None, b''
+        validated = False
+
+        for data in iter(lambda: stream.read(64 * 1024), b''):
+            decoder.receive_data(data)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    part, chunks, size = event, [], 0
+                elif isinstance(event, File):
+                    if not validated:
+                        self.before_file(fields)
+                        validated = True
+                    part, head = event, b''
+                    container = self.stream_factory(
+                        total_content_length=content_length, filename=event.filename,
+                        content_type=event.headers.get('content-type'), content_length=0
+                    )
+                elif isinstance(event, Data):
+                    if isinstance(part, Field):
+                        size += len(event.data)
+                        if size > MAX_FORM_FIELD_BYTES:
+                            raise RequestEntityTooLarge(f"Form field {part.name!r} is larger than {MAX_FORM_FIELD_BYTES // 1024} KB.")
+                        chunks.append(event.data)
+                        if not event.more_data:
+                            fields.append((part.name, b''.join(chunks).decode('utf-8', 'replace')))
+                    else:
+                        head = self.write_file_data(container, head, event.data, event.more_data, part)
+                        if not event.more_data:
+                            container.seek(0)
+                            files.append((part.name, self.file_storage(container, part, head)))
+                event = decoder.next_event()
+
+        if not validated:
+            self.before_file(fields)
+        return self.cls(fields), self.cls(files)
+
+    def write_file_data(self, container, head, data, more_data, part):
+        """Write file data, checking the type once SNIFF_BYTES have arrived."""
+        if len(head) < SNIFF_BYTES:
+            head += data[:SNIFF_BYTES - len(head)]
+            complete = len(head) >= SNIFF_BYTES or not more_data
+            if complete and self.rule.get("images") and part.filename and head and not sniff_image_type(head):
+                raise UnsupportedMediaType("Only JPEG, PNG, GIF, WebP or HEIC images can be uploaded.")
+        container.write(data)
+        return head
+
+    def file_storage(self, container, part, head):
+        headers = Headers(part.headers)
+        sniffed = sniff_image_type(head) if self.rule.get("images") else None
+        if sniffed:
+            # Trust the bytes, not the client's Content-Type
+            headers['Content-Type'] = sniffed
+        return FileStorage(container, part.filename, part.name, headers=headers)
+
+class CheckedFormDataParser(FormDataParser):
+    def __init__(self, *args, rule=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rule = rule
+
+    def _parse_multipart(self, stream, mimetype, content_length, options):
+        if self.rule is None:
+            return super()._parse_multipart(stream, mimetype, content_length, options)
+        boundary = options.get("boundary", "").encode("ascii")
+        if not boundary:
+            raise ValueError("Missing boundary")
+        parser = CheckedMultiPartParser(
+            self.rule, self.stream_factory or default_stream_factory, self.max_form_parts, self.cls
+        )
+        form, files = parser.parse(stream, boundary, content_length)
+        return stream, form, files
+
+class LimitedRequest(Request):
+    """Request whose body limit and multipart parsing follow BODY_RULES."""
+
+    @property
+    def body_rule(self):
+        return BODY_RULES.get(self.endpoint)
+
+    @property
+    def max_content_length(self):
+        rule = self.body_rule
+        return rule["max_bytes"] if rule else super().max_content_length
+
+    def make_form_data_parser(self):
+        return CheckedFormDataParser(
+            self._get_file_stream,
+            max_form_memory_size=self.max_form_memory_size,
+            max_content_length=self.max_content_length,
+            max_form_parts=self.max_form_parts,
+            cls=self.parameter_storage_class,
+            rule=self.body_rule
+        )
+
+# --- FLASK INTEGRATION ---
+
+def wants_json():
+    return request.path.startswith('/api/') or request.is_json
+
+def init_limits(app):
+    app.request_class = LimitedRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+
+    @app.before_request
+    def reject_oversized_body():
+        # Declared length over the cap: answer before reading anything
+        limit = request.max_content_length
+        if limit is not None and request.content_length is not None and request.content_length > limit:
+            raise RequestEntityTooLarge(f"The request body is larger than {limit // 1024} KB.")
+
+    @app.errorhandler(RequestEntityTooLarge)
+    @app.errorhandler(UnsupportedMediaType)
+    @app.errorhandler(BadRequest)
+    def rejected_body(e):
+        if not isinstance(e, HTTPException) or request.endpoint not in BODY_RULES:
+            return e
+        if wants_json():
+            return jsonify({'error': e.description}), e.code
+        flash(e.description, "danger")
+        return redirect(request.referrer or '/'), 303
@@ -0,0 +1,184 @@
+import math
+import os
+from flask import Blueprint, jsonify, render_template
+from pymongo import MongoClient
+from datetime import datetime, timedelta
+from workflow import STATUSES
+from auth import require_role, current_identity, ALL_ROLES
+
+# Create a Blueprint for the map API
+map_api = Blueprint('map_api', __name__)
+
+# Each tile is split into a GRID_SIZE x GRID_SIZE grid of clusters
+GRID_SIZE = 8
+
+# From this zoom level on, individual markers are returned instead of clusters
+# (admins only, see map_tile)
+MARKER_ZOOM = 16
+MAX_MARKERS_PER_TILE = 500
+
+# Tiles for non-admins never cluster finer than the grid at this zoom level
+PUBLIC_CLUSTER_ZOOM = MARKER_ZOOM - 1
+MIN_ZOOM, MAX_ZOOM = 3, 20
+
+# Cached tiles expire so status changes show up without explicit invalidation
+TILE_CACHE_TTL = int(os.getenv('MAP_TILE_CACHE_TTL', 300))
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_map_indexes(db):
+    db.grievances.create_index([("latitude", 1), ("longitude", 1)])
+    db.map_tiles.create_index("expires_at", expireAfterSeconds=0)
+
+# --- TILE MATH (standard slippy-map z/x/y tiles) ---
+
+def tile_bounds(z, x, y):
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+def tile_for_point(latitude, longitude, z):
+    n = 2 ** z
+    lat = max(min(latitude, 85.0511), -85.0511)
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_key(z, x, y):
+    return f"{z}/{x}/{y}"
+
+def cache_key(z, x, y, detailed):
+    key = tile_key(z, x, y)
+    return key if detailed else f"{key}/public"
+
+# --- CLUSTERING ---
+
+def build_tile(db, z, x, y, detailed=True):
+    """Clusters for one tile, or markers from MARKER_ZOOM on.
+
+    A tile that is not `detailed` has clusters only, placed at the centre of
+    their grid cell so a lone grievance is not pinpointed; past
+    PUBLIC_CLUSTER_ZOOM it shows the clusters of that zoom's grid.
+    """
+    south, west, north, east = tile_bounds(z, x, y)
+    if not detailed and z > PUBLIC_CLUSTER_ZOOM:
+        shift = z - PUBLIC_CLUSTER_ZOOM
+        coarse = get_tile(db, PUBLIC_CLUSTER_ZOOM, x >> shift, y >> shift, detailed=False)
+        return {
+            "clusters": [
+                cluster for cluster in coarse["clusters"]
+                if south <= cluster["lat"] < north and west <= cluster["lng"] < east
+            ]
+        }
+    bbox = {
+        "latitude": {"$gte": south, "$lt": north},
+        "longitude": {"$gte": west, "$lt": east}
+    }
+
+    if detailed and z >= MARKER_ZOOM:
+        cursor = db.grievances.find(
+            bbox, {"latitude": 1, "longitude": 1, "status": 1, "location": 1}
+        ).limit(MAX_MARKERS_PER_TILE)
+        return {
+            "markers": [
+                {
+                    "id": str(g["_id"]),
+                    "lat": g["latitude"],
+                    "lng": g["longitude"],
+                    "status": g.get("status"),
+                    "location": g.get("location")
+                }
+                for g in cursor
+            ]
+        }
+
+    cell_lat = (north - south) / GRID_SIZE
+    cell_lng = (east - west) / GRID_SIZE
+    status_counts = {
+        status: {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+        for status in STATUSES
+    }
+    pipeline = [
+        {"$match": bbox},
+        {
+            "$group": {
+                "_id": {
+                    "row": {"$floor": {"$divide": [{"$subtract": ["$latitude", south]}, cell_lat]}},
+                    "col": {"$floor": {"$divide": [{"$subtract": ["$longitude", west]}, cell_lng]}}
+                },
+                "count": {"$sum": 1},
+                "lat": {"$avg": "$latitude"},
+                "lng": {"$avg": "$longitude"},
+                **status_counts
+            }
+        }
+    ]
+
+    def position(cell):
+        if detailed:
+            return cell["lat"], cell["lng"]
+        return south + (cell["_id"]["row"] + 0.5) * cell_lat, west + (cell["_id"]["col"] + 0.5) * cell_lng
+
+    return {
+        "clusters": [
+            {
+                "lat": position(cell)[0],
+                "lng": position(cell)[1],
+                "count": cell["count"],
+                "by_status": {status: cell[status] for status in STATUSES if cell[status]}
+            }
+            for cell in db.grievances.aggregate(pipeline)
+        ]
+    }
+
+def get_tile(db, z, x, y, detailed=True):
+    key = cache_key(z, x, y, detailed)
+    now = datetime.utcnow()
+
+    cached = db.map_tiles.find_one({"_id": key, "expires_at": {"$gt": now}})
+    if cached:
+        return cached["data"]
+
+    data = build_tile(db, z, x, y, detailed)
+    db.map_tiles.replace_one(
+        {"_id": key},
+        {"data": data, "expires_at": now + timedelta(seconds=TILE_CACHE_TTL)},
+        upsert=True
+    )
+    return data
+
+def invalidate_tiles(db, latitude, longitude):
+    """Drop the cached tile containing this point at every zoom level."""
+    keys = [
+        cache_key(z, *tile_for_point(float(latitude), float(longitude), z), detailed)
+        for z in range(MIN_ZOOM, MAX_ZOOM + 1)
+        for detailed in (True, False)
+    ]
+    db.map_tiles.delete_many({"_id": {"$in": keys}})
+
+# --- ROUTES ---
+
+# Pre-clustered grievances for one map tile. Only admins see individual
+# grievances; citizens and contractors get cluster counts at every zoom.
+@map_api.route('/api/map/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@require_role(*ALL_ROLES, api=True)
+def map_tile(z, x, y):
+    if not MIN_ZOOM <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Invalid tile'}), 400
+
+    db = get_db_connection()
+    detailed = current_identity()["role"] == "admin"
+    response = jsonify(dict(get_tile(db, z, x, y, detailed), tile=tile_key(z, x, y)))
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+# Citywide grievance map for admins
+@map_api.route('/grievance-map')
+@require_role('admin')
+def grievance_map():
+    return render_template('leafletmap.html')
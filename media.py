@@ -0,0 +1,236 @@
+"""Storage for uploaded photos (grievance photos, completion proofs).
+
+MEDIA_STORE picks the backend:
+  cloudinary  Cloudinary (default), uploaded in chunks with upload_large
+  local       files under MEDIA_ROOT, served by /media/<key>
+  memory      an in-process object store with the same interface as the local
+              one; a stand-in for an S3-compatible bucket in tests
+
+Uploads are read from the request in CHUNK_SIZE pieces and hashed on the
+way, so a file is never held in memory whole. Stored files are named by
+their SHA-256, so the same photo uploaded twice is stored once. A JPEG
+thumbnail is written next to every image for the dashboard lists; list
+templates pick it with thumbnail_src().
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from flask import Blueprint, abort, send_file, url_for
+from werkzeug.utils import secure_filename
+import cloudinary
+import cloudinary.uploader
+
+logger = logging.getLogger(__name__)
+
+media_api = Blueprint('media_api', __name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Uploads above this size are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 1024 * 1024
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 75
+THUMBNAIL_PREFIX = 'thumbs/'
+
+# Cloudinary builds the thumbnail at upload time instead of on first view
+CLOUDINARY_THUMBNAIL = {"width": THUMBNAIL_SIZE[0], "height": THUMBNAIL_SIZE[1], "crop": "fill", "format": "jpg"}
+
+# Content-hash names never change, so browsers may keep them for a year
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+class StoredMedia:
+    def __init__(self, key, url, thumbnail_url=None):
+        self.key = key
+        self.url = url
+        self.thumbnail_url = thumbnail_url
+
+def extension(filename):
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return ext if len(ext) <= 6 else ''
+
+def content_key(digest, filename):
+    """Storage key of a file: <first two hex digits>/<sha256><ext>."""
+    return f"{digest[:2]}/{digest}{extension(filename)}"
+
+def thumbnail_key(key):
+    return THUMBNAIL_PREFIX + os.path.splitext(key)[0] + '.jpg'
+
+def copy_hashed(source, target):
+    """Copy a stream into target chunk by chunk; returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        target.write(chunk)
+    return digest.hexdigest()
+
+def make_thumbnail(source):
+    """JPEG thumbnail bytes of an image file object, or None if it is not an image."""
+    try:
+        from PIL import Image, ImageOps
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            return output.getvalue()
+    except Exception as e:
+        logger.warning("No thumbnail generated: %s", e)
+        return None
+
+# --- BACKENDS ---
+
+class CloudinaryMediaStore:
+    """Cloudinary, with the content hash as public_id."""
+
+    def save(self, file):
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            digest = copy_hashed(file.stream, spool)
+            spool.seek(0)
+            # overwrite=False: an existing public_id is kept, not stored again
+            result = cloudinary.uploader.upload_large(
+                spool,
+                public_id=digest,
+                filename=secure_filename(file.filename or '') or 'upload',
+                overwrite=False,
+                unique_filename=False,
+                chunk_size=6 * 1024 * 1024,
+                eager=[CLOUDINARY_THUMBNAIL]
+            )
+        eager = result.get('eager') or []
+        thumbnail_url = eager[0].get('secure_url') if eager else cloudinary.CloudinaryImage(result['public_id']).build_url(
+            secure=True, **CLOUDINARY_THUMBNAIL
+        )
+        return StoredMedia(result['public_id'], result['secure_url'], thumbnail_url)
+
+class LocalMediaStore:
+    """Files under a directory, named by content hash."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def write(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+
+    def save(self, file):
+        os.makedirs(self.root, exist_ok=True)
+        # Stream into a temporary file next to the final location, then rename by hash
+        with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as tmp:
+            try:
+                digest = copy_hashed(file.stream, tmp)
+            except Exception:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+        key = content_key(digest, file.filename)
+        if self.exists(key):
+            os.remove(tmp.name)
+        else:
+            os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+            os.replace(tmp.name, self.path(key))
+        return finish_save(self, key)
+
+class MemoryMediaStore:
+    """Objects in a dict, like a bucket in an S3-compatible store; for tests."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def exists(self, key):
+        return key in self.objects
+
+    def open(self, key):
+        return io.BytesIO(self.objects[key])
+
+    def write(self, key, data):
+        self.objects[key] = bytes(data)
+
+    def save(self, file):
+        buffer = io.BytesIO()
+        digest = copy_hashed(file.stream, buffer)
+        key = content_key(digest, file.filename)
+        if not self.exists(key):
+            self.write(key, buffer.getvalue())
+        return finish_save(self, key)
+
+def finish_save(store, key):
+    """Thumbnail the stored file (once per content hash) and build its URLs."""
+    thumb_key = thumbnail_key(key)
+    if not store.exists(thumb_key):
+        with store.open(key) as source:
+            thumbnail = make_thumbnail(source)
+        if thumbnail is None:
+            return StoredMedia(key, media_url(key))
+        store.write(thumb_key, thumbnail)
+    return StoredMedia(key, media_url(key), media_url(thumb_key))
+
+def media_url(key):
+    return url_for('media_api.media_file', key=key)
+
+def thumbnail_src(url, thumbnail_url=None):
+    """Thumbnail to show in a list for an image URL.
+
+    Uses the thumbnail URL saved with the grievance; photos stored before
+    thumbnails were saved fall back to a Cloudinary transformation or the
+    local thumbnail file. None means no thumbnail is available.
+    """
+    if thumbnail_url or not url:
+        return thumbnail_url
+    if 'res.cloudinary.com' in url and '/image/upload/' in url:
+        transformation = 'c_{crop},f_{format},h_{height},w_{width}'.format(**CLOUDINARY_THUMBNAIL)
+        return url.replace('/image/upload/', f'/image/upload/{transformation}/', 1)
+    prefix = media_url('_')[:-1]  # "/media/", including any application root
+    store = get_media_store()
+    if url.startswith(prefix) and not isinstance(store, CloudinaryMediaStore):
+        thumb_key = thumbnail_key(url[len(prefix):])
+        if store.exists(thumb_key):
+            return media_url(thumb_key)
+    return None
+
+_store = None
+
+def get_media_store():
+    """The configured MEDIA_STORE backend, created once per process."""
+    global _store
+    if _store is None:
+        kind = os.getenv('MEDIA_STORE', 'cloudinary').lower()
+        if kind == 'cloudinary':
+            _store = CloudinaryMediaStore()
+        elif kind == 'local':
+            _store = LocalMediaStore(os.getenv('MEDIA_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media')))
+        elif kind == 'memory':
+            _store = MemoryMediaStore()
+        else:
+            raise ValueError(f"Unknown MEDIA_STORE {kind!r} (expected cloudinary, local or memory)")
+    return _store
+
+def save_upload(file):
+    """Store an uploaded werkzeug FileStorage; returns StoredMedia."""
+    return get_media_store().save(file)
+
+# --- ROUTES ---
+
+# Files of the local and memory stores
+@media_api.route('/media/<path:key>')
+def media_file(key):
+    store = get_media_store()
+    if isinstance(store, CloudinaryMediaStore) or '..' in key.split('/') or not store.exists(key):
+        abort(404)
+    response = send_file(store.open(key), download_name=os.path.basename(key), conditional=False)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    return response
@@ -0,0 +1,208 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from scheduler import register_job
+
+# Citizen notifications for grievance status changes.
+#
+# Status transitions add rows to the notification_outbox collection (one small
+# insert, like the analytics queue and the event log). The "notifications"
+# scheduler job sends them in batches: all pending rows of one citizen become
+# a single message, with only the latest status of each grievance, so the
+# request path never waits on an SMS provider.
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_INTERVAL = int(os.getenv('NOTIFY_INTERVAL', 60))
+NOTIFY_BATCH_SIZE = 200
+NOTIFY_LEASE_SECONDS = 120
+
+# Failed sends are retried after RETRY_BASE_SECONDS * 2^attempts, up to MAX_ATTEMPTS times
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+
+# Finished rows (sent, skipped, stubbed or failed) are kept this long for
+# auditing, then expire
+SENT_RETENTION_SECONDS = 30 * 24 * 3600
+
+STATUS_LABELS = {
+    "pending": "received",
+    "In Progress": "assigned to a contractor",
+    "Resolved": "marked as fixed and awaiting verification",
+    "completed": "verified as completed",
+}
+
+def ensure_notify_indexes(db):
+    db.notification_outbox.create_index([("state", 1), ("next_attempt_at", 1)])
+    # At most one pending notification per grievance and status
+    db.notification_outbox.create_index(
+        "dedup_key", unique=True, partialFilterExpression={"state": "pending"}
+    )
+    db.notification_outbox.create_index("sent_at", expireAfterSeconds=SENT_RETENTION_SECONDS)
+    db.notification_outbox.create_index("failed_at", expireAfterSeconds=SENT_RETENTION_SECONDS)
+
+# --- WRITE PATH ---
+
+def queue_notifications(db, changes, at=None):
+    """Queue a notification for each (before, target) status change.
+
+    `before` is the grievance as it was (it needs _id, user_id, location and
+    status). Changes that leave the status as it was are skipped, and a
+    notification already pending for the same grievance and status is not
+    queued twice. Nothing is queued while no provider is configured, since
+    nothing would ever send it.
+    """
+    if not notifications_enabled():
+        return
+    at = at or datetime.utcnow()
+    rows = [
+        {
+            "citizen_id": before.get("user_id"),
+            "grievance_id": before["_id"],
+            "location": before.get("location"),
+            "status": target,
+            "dedup_key": f"{before['_id']}:{target}",
+            "state": "pending",
+            "attempts": 0,
+            "created_at": at,
+            "next_attempt_at": at
+        }
+        for before, target in changes
+        if before.get("user_id") and before.get("status") != target
+    ]
+    if not rows:
+        return
+
+    try:
+        db.notification_outbox.insert_many(rows, ordered=False)
+    except BulkWriteError as e:
+        # Duplicates of pending notifications are expected; anything else is not
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+# --- PROVIDERS ---
+
+class StubProvider:
+    """Keeps messages in memory instead of sending them; for development and tests.
+
+    Nothing is delivered, so it reports None for every message and the rows
+    are marked "stubbed", never "sent". Messages are not logged: they carry
+    phone numbers.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send_batch(self, messages):
+        logger.debug("Stub provider kept %d notification(s)", len(messages))
+        self.sent.extend(messages)
+        return [None] * len(messages)
+
+_provider = None
+
+def notifications_enabled():
+    return bool(os.getenv('NOTIFY_PROVIDER'))
+
+def get_provider():
+    """The NOTIFY_PROVIDER backend, or None when none is configured.
+
+    A provider takes a list of messages ({"to", "text"}) and returns one
+    result per message: True when delivered, False to retry later, None
+    when it does not deliver at all.
+    """
+    global _provider
+    if not notifications_enabled():
+        return None
+    kind = os.getenv('NOTIFY_PROVIDER').lower()
+    if _provider is None:
+        if kind == 'stub':
+            _provider = StubProvider()
+        else:
+            raise ValueError(f"Unknown NOTIFY_PROVIDER {kind!r} (expected stub)")
+    return _provider
+
+# --- SENDING ---
+
+def compose_message(rows):
+    """One SMS for all of a citizen's pending rows, latest status per grievance."""
+    latest = {}
+    for row in sorted(rows, key=lambda row: row["created_at"]):
+        latest[row["grievance_id"]] = row
+
+    updates = [
+        f"{row.get('location') or 'your grievance'} is {STATUS_LABELS.get(row['status'], row['status'])}"
+        for row in latest.values()
+    ]
+    if len(updates) == 1:
+        return f"UrbanUnity: Your grievance at {updates[0]}."
+    return "UrbanUnity updates: " + "; ".join(updates) + "."
+
+def retry_update(row, now):
+    attempts = row.get("attempts", 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        return {"$set": {"state": "failed", "attempts": attempts, "failed_at": now}}
+    return {"$set": {
+        "attempts": attempts,
+        "next_attempt_at": now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** attempts)
+    }}
+
+@register_job("notifications", interval=NOTIFY_INTERVAL, lease=NOTIFY_LEASE_SECONDS)
+def send_notifications(db, now=None, limit=NOTIFY_BATCH_SIZE):
+    """Send due outbox rows, one coalesced message per citizen."""
+    provider = get_provider()
+    if provider is None:
+        # Rows queued before the provider was removed wait for one to return
+        return {"sent": 0, "failed": 0, "provider": None}
+
+    now = now or datetime.utcnow()
+    rows = list(db.notification_outbox.find(
+        {"state": "pending", "next_attempt_at": {"$lte": now}}
+    ).sort("next_attempt_at", 1).limit(limit))
+    if not rows:
+        return {"sent": 0, "failed": 0}
+
+    by_citizen = {}
+    for row in rows:
+        by_citizen.setdefault(row["citizen_id"], []).append(row)
+    phones = {
+        citizen["_id"]: citizen.get("phone_number")
+        for citizen in db.citizens.find({"_id": {"$in": list(by_citizen)}}, {"phone_number": 1})
+    }
+
+    messages, batches, updates = [], [], []
+    for citizen_id, citizen_rows in by_citizen.items():
+        if not phones.get(citizen_id):
+            # Nobody to send to: drop rather than retry forever
+            updates.extend(
+                UpdateOne({"_id": row["_id"]}, {"$set": {"state": "skipped", "sent_at": now}})
+                for row in citizen_rows
+            )
+            continue
+        messages.append({"to": phones[citizen_id], "citizen_id": citizen_id, "text": compose_message(citizen_rows)})
+        batches.append(citizen_rows)
+
+    try:
+        results = provider.send_batch(messages) if messages else []
+    except Exception:
+        logger.exception("Notification provider failed; %d message(s) will be retried", len(messages))
+        results = [False] * len(messages)
+
+    sent = failed = 0
+    for citizen_rows, ok in zip(batches, results):
+        for row in citizen_rows:
+            if ok is None:
+                updates.append(UpdateOne({"_id": row["_id"]}, {"$set": {"state": "stubbed", "sent_at": now}}))
+            elif ok:
+                updates.append(UpdateOne({"_id": row["_id"]}, {"$set": {"state": "sent", "sent_at": now}}))
+            else:
+                updates.append(UpdateOne({"_id": row["_id"]}, retry_update(row, now)))
+        if ok:
+            sent += 1
+        elif ok is not None:
+            failed += 1
+
+    if updates:
+        db.notification_outbox.bulk_write(updates, ordered=False)
+    return {"sent": sent, "failed": failed}
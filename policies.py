@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from flask import Blueprint, request, jsonify, has_request_context
+from pymongo import monitoring, WriteConcern
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from auth import require_role
+
+# Read preference and write concern per class of operation.
+#
+# Dashboard, analytics and chatbot reads may be served by a secondary that is
+# at most MAX_STALENESS_SECONDS behind; status transitions wait for a
+# majority of the replica set; feedback inserts only wait for the primary;
+# rebuilds of maintained counters read from the primary.
+# Everything else keeps the driver defaults. Use with_policy(db, operation)
+# to get a database handle for one class of operation.
+
+policy_api = Blueprint('policy_api', __name__)
+
+# The driver's minimum is 90 seconds
+MAX_STALENESS_SECONDS = max(int(os.getenv('MAX_STALENESS_SECONDS', 120)), 90)
+
+# DB_READ_OFFLOAD=0 sends every read to the primary
+READ_OFFLOAD = os.getenv('DB_READ_OFFLOAD', '1') != '0'
+
+# How long a majority write may wait before the driver reports a timeout
+TRANSITION_WTIMEOUT_MS = 5000
+
+OPERATION_POLICIES = {
+    "dashboard": {"read_preference": SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)},
+    "analytics": {"read_preference": SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)},
+    "chatbot": {"read_preference": SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)},
+    "transition": {"read_preference": Primary(),
+                   "write_concern": WriteConcern(w="majority", wtimeout=TRANSITION_WTIMEOUT_MS)},
+    "feedback": {"write_concern": WriteConcern(w=1)},
+    # Recounts that seed maintained counters must not miss recent writes
+    "rebuild": {"read_preference": Primary(),
+                "write_concern": WriteConcern(w="majority", wtimeout=TRANSITION_WTIMEOUT_MS)},
+}
+
+# A browser that just wrote something reads from the primary for a while,
+# so it sees its own change on the page it is redirected to
+READ_PRIMARY_COOKIE = 'read_primary'
+
+def reads_pinned_to_primary():
+    return not READ_OFFLOAD or (has_request_context() and request.cookies.get(READ_PRIMARY_COOKIE) == '1')
+
+def with_policy(db, operation):
+    """`db` with the read preference and write concern of an operation class."""
+    options = dict(OPERATION_POLICIES[operation])
+    if "read_preference" in options and reads_pinned_to_primary():
+        options["read_preference"] = Primary()
+    metrics.count_policy(operation, options.get("read_preference"))
+    return db.with_options(**options)
+
+# --- METRICS ---
+
+READ_COMMANDS = {"find", "getMore", "aggregate", "count", "distinct"}
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+class DatabaseMetrics(monitoring.CommandListener, monitoring.ServerListener):
+    """Counts commands by the kind of server that ran them, for this process.
+
+    Registered globally, so it sees every MongoClient created afterwards.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server_types = {}
+        self.started_at = time.time()
+        self.reads = {}
+        self.writes = {}
+        self.policies = {}
+
+    # ServerListener: remember which address is the primary, a secondary, ...
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        self.server_types[event.server_address] = event.new_description.server_type_name
+
+    def closed(self, event):
+        self.server_types.pop(event.server_address, None)
+
+    # CommandListener
+    def started(self, event):
+        name = event.command_name
+        if name in READ_COMMANDS:
+            server = self.server_types.get(event.connection_id, "Unknown")
+            with self.lock:
+                self.reads[server] = self.reads.get(server, 0) + 1
+        elif name in WRITE_COMMANDS:
+            w = str((event.command.get("writeConcern") or {}).get("w", "default"))
+            with self.lock:
+                self.writes[w] = self.writes.get(w, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def count_policy(self, operation, read_preference):
+        key = f"{operation}:{read_preference.name if read_preference else 'default'}"
+        with self.lock:
+            self.policies[key] = self.policies.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            reads, writes, policies = dict(self.reads), dict(self.writes), dict(self.policies)
+        total_reads = sum(reads.values())
+        secondary_reads = reads.get("RSSecondary", 0)
+        return {
+            "since": self.started_at,
+            "reads_by_server": reads,
+            "writes_by_write_concern": writes,
+            "policy_uses": policies,
+            "primary_offload": round(secondary_reads / total_reads, 4) if total_reads else 0.0,
+            "max_staleness_seconds": MAX_STALENESS_SECONDS,
+            "read_offload": READ_OFFLOAD
+        }
+
+metrics = DatabaseMetrics()
+monitoring.register(metrics)
+
+def init_policies(app):
+    @app.after_request
+    def pin_reads_after_write(response):
+        if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400 and READ_OFFLOAD:
+            response.set_cookie(READ_PRIMARY_COOKIE, '1', max_age=MAX_STALENESS_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+# Database operation counts of this worker process
+@policy_api.route('/api/metrics/database', methods=['GET'])
+@require_role('admin', api=True)
+def database_metrics():
+    return jsonify(metrics.snapshot())
@@ -0,0 +1,305 @@
+"""Repositories for citizens, contractors, grievances and feedback.
+
+The app reads and writes accounts, grievances and feedback through the
+MongoDB repositories. Each one has an in-memory double with the same
+methods and behaviour, for unit tests and benchmarks that need no server;
+tests/test_repos.py holds both to the same contract. The app itself always
+runs on MongoDB, since the dashboards, workflow, analytics and login checks
+query it directly.
+
+Run `python repos.py` to time the hot-path queries of both (MongoDB is
+skipped when no server answers at MONGODB_URI).
+"""
+import copy
+import os
+import time
+from datetime import datetime
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from policies import with_policy
+from workflow import COMPLETED
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def newest_first(docs, field="submitted_at"):
+    return sorted(docs, key=lambda doc: (doc.get(field) or datetime.min, doc["_id"]), reverse=True)
+
+def projected(doc, fields):
+    """Copy of doc with only the given fields (and _id), or all of them."""
+    if doc is None:
+        return None
+    if not fields:
+        return copy.deepcopy(doc)
+    return {key: copy.deepcopy(value) for key, value in doc.items() if key == "_id" or key in fields}
+
+def field_projection(fields):
+    return {field: 1 for field in fields} if fields else None
+
+# --- MONGODB ---
+
+class MongoCitizenRepo:
+    def __init__(self, db):
+        self.collection = db.citizens
+
+    def get(self, citizen_id, fields=None):
+        return self.collection.find_one({"_id": citizen_id}, field_projection(fields))
+
+    def find_by_username(self, username):
+        return self.collection.find_one({"username": username})
+
+    def create(self, data):
+        return self.collection.insert_one(dict(data)).inserted_id
+
+class MongoContractorRepo:
+    def __init__(self, db):
+        self.collection = db.contractors
+
+    def get(self, contractor_id):
+        return self.collection.find_one({"_id": contractor_id})
+
+    def find_by_username(self, username):
+        return self.collection.find_one({"username": username})
+
+    def list_public(self):
+        """All contractors, without their password hashes."""
+        return list(self.collection.find({}, {"password": 0}))
+
+    def create(self, data):
+        return self.collection.insert_one(dict(data)).inserted_id
+
+class MongoGrievanceRepo:
+    def __init__(self, db):
+        self.collection = db.grievances
+        self.archive = db.grievances_archive
+
+    def get(self, grievance_id, user_id=None, archived=False):
+        """A grievance by id; with user_id, only if that citizen filed it.
+        With archived, an archived grievance is found too."""
+        query = {"_id": grievance_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        grievance = self.collection.find_one(query)
+        if grievance is None and archived:
+            grievance = self.archive.find_one(query)
+        return grievance
+
+    def find_by_idempotency_key(self, user_id, key, fields=None):
+        return self.collection.find_one({"user_id": user_id, "idempotency_key": key}, field_projection(fields))
+
+    def create(self, data):
+        """Insert a grievance; raises DuplicateKeyError for a repeated (user_id, idempotency_key)."""
+        return self.collection.insert_one(dict(data)).inserted_id
+
+    def list_for_user(self, user_id):
+        return list(self.collection.find({"user_id": user_id}).sort([("submitted_at", -1), ("_id", -1)]))
+
+    def status_counts(self, user_id=None):
+        pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        if user_id is not None:
+            pipeline.insert(0, {"$match": {"user_id": user_id}})
+        counts = {item["_id"]: item["count"] for item in self.collection.aggregate(pipeline)}
+        # Archived grievances are all completed
+        archived = self.archive.count_documents({} if user_id is None else {"user_id": user_id})
+        if archived:
+            counts[COMPLETED] = counts.get(COMPLETED, 0) + archived
+        return counts
+
+class MongoFeedbackRepo:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.feedback
+
+    def create(self, data):
+        # Feedback is not worth a majority round trip
+        return with_policy(self.db, "feedback").feedback.insert_one(dict(data)).inserted_id
+
+    def list_for_user(self, user_id):
+        return list(self.collection.find({"user_id": user_id}).sort([("submitted_at", -1), ("_id", -1)]))
+
+# --- IN-MEMORY ---
+
+class MemoryCollection:
+    """Documents by _id; callers only ever get copies."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def insert(self, data):
+        doc = copy.deepcopy(data)
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        self.docs[doc["_id"]] = doc
+        return doc["_id"]
+
+    def find_one(self, predicate, fields=None):
+        return projected(next((doc for doc in self.docs.values() if predicate(doc)), None), fields)
+
+    def find(self, predicate, fields=None):
+        return [projected(doc, fields) for doc in newest_first(d for d in self.docs.values() if predicate(d))]
+
+class MemoryCitizenRepo:
+    def __init__(self):
+        self.store = MemoryCollection()
+
+    def get(self, citizen_id, fields=None):
+        return projected(self.store.docs.get(citizen_id), fields)
+
+    def find_by_username(self, username):
+        return self.store.find_one(lambda doc: doc.get("username") == username)
+
+    def create(self, data):
+        return self.store.insert(data)
+
+class MemoryContractorRepo:
+    def __init__(self):
+        self.store = MemoryCollection()
+
+    def get(self, contractor_id):
+        return projected(self.store.docs.get(contractor_id), None)
+
+    def find_by_username(self, username):
+        return self.store.find_one(lambda doc: doc.get("username") == username)
+
+    def list_public(self):
+        contractors = [projected(doc, None) for doc in self.store.docs.values()]
+        for contractor in contractors:
+            contractor.pop("password", None)
+        return contractors
+
+    def create(self, data):
+        return self.store.insert(data)
+
+class MemoryGrievanceRepo:
+    def __init__(self):
+        self.store = MemoryCollection()
+        # (user_id, idempotency_key) -> grievance id, like the partial unique index
+        self.idempotency_keys = {}
+
+    def get(self, grievance_id, user_id=None, archived=False):
+        # Nothing is archived in memory
+        doc = self.store.docs.get(grievance_id)
+        if doc is None or (user_id is not None and doc.get("user_id") != user_id):
+            return None
+        return projected(doc, None)
+
+    def find_by_idempotency_key(self, user_id, key, fields=None):
+        grievance_id = self.idempotency_keys.get((user_id, key))
+        return projected(self.store.docs.get(grievance_id), fields) if grievance_id else None
+
+    def create(self, data):
+        key = data.get("idempotency_key")
+        if key and (data.get("user_id"), key) in self.idempotency_keys:
+            raise DuplicateKeyError(f"duplicate idempotency key {key}")
+        grievance_id = self.store.insert(data)
+        if key:
+            self.idempotency_keys[(data.get("user_id"), key)] = grievance_id
+        return grievance_id
+
+    def list_for_user(self, user_id):
+        return self.store.find(lambda doc: doc.get("user_id") == user_id)
+
+    def status_counts(self, user_id=None):
+        counts = {}
+        for doc in self.store.docs.values():
+            if user_id is None or doc.get("user_id") == user_id:
+                counts[doc.get("status")] = counts.get(doc.get("status"), 0) + 1
+        return counts
+
+class MemoryFeedbackRepo:
+    def __init__(self):
+        self.store = MemoryCollection()
+
+    def create(self, data):
+        return self.store.insert(data)
+
+    def list_for_user(self, user_id):
+        return self.store.find(lambda doc: doc.get("user_id") == user_id)
+
+# --- BACKENDS ---
+
+class Repos:
+    def __init__(self, citizens, contractors, grievances, feedback):
+        self.citizens = citizens
+        self.contractors = contractors
+        self.grievances = grievances
+        self.feedback = feedback
+
+def mongo_repos(db):
+    return Repos(MongoCitizenRepo(db), MongoContractorRepo(db), MongoGrievanceRepo(db), MongoFeedbackRepo(db))
+
+def memory_repos():
+    return Repos(MemoryCitizenRepo(), MemoryContractorRepo(), MemoryGrievanceRepo(), MemoryFeedbackRepo())
+
+def make_repos(db_factory=None):
+    """MongoDB repositories; db_factory supplies the database."""
+    return mongo_repos((db_factory or get_db_connection)())
+
+# --- BENCHMARK ---
+
+def time_hot_paths(repos, rows=2000, lookups=500):
+    """Seconds per call of the repository reads on the request path."""
+    citizen_ids = [repos.citizens.create({"username": f"bench-{i}", "phone_number": str(i)}) for i in range(rows // 10)]
+    for i in range(rows):
+        repos.grievances.create({
+            "user_id": citizen_ids[i % len(citizen_ids)], "status": "pending",
+            "submitted_at": datetime.utcnow(), "idempotency_key": f"bench-{i}"
+        })
+
+    timings = {}
+    operations = {
+        "citizens.find_by_username": lambda i: repos.citizens.find_by_username(f"bench-{i % len(citizen_ids)}"),
+        "grievances.find_by_idempotency_key": lambda i: repos.grievances.find_by_idempotency_key(
+            citizen_ids[i % len(citizen_ids)], f"bench-{i}"),
+        "grievances.list_for_user": lambda i: repos.grievances.list_for_user(citizen_ids[i % len(citizen_ids)]),
+        "grievances.status_counts": lambda i: repos.grievances.status_counts(citizen_ids[i % len(citizen_ids)]),
+    }
+    for name, operation in operations.items():
+        start = time.perf_counter()
+        for i in range(lookups):
+            operation(i)
+        timings[name] = (time.perf_counter() - start) / lookups
+    return timings
+
+def scratch_mongo_repos():
+    """Repositories on a throwaway database, or None when MongoDB is unreachable."""
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"MongoDB unavailable, skipping: {e}")
+        return None, None
+    name = f"urbanunity_scratch_{ObjectId()}"
+    db = client[name]
+    ensure_repo_indexes(db)
+    return mongo_repos(db), lambda: client.drop_database(name)
+
+def ensure_repo_indexes(db):
+    """The app's indexes that the repositories' behaviour depends on."""
+    db.citizens.create_index("username")
+    db.grievances.create_index([("user_id", 1), ("submitted_at", -1), ("_id", -1)])
+    db.grievances.create_index(
+        [("user_id", 1), ("idempotency_key", 1)],
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$exists": True}}
+    )
+
+def run_backend(name, factory):
+    """Hot-path timings for one backend; factory returns (repos, cleanup)."""
+    repos, cleanup = factory()
+    if repos is None:
+        return
+    try:
+        timings = time_hot_paths(repos)
+    finally:
+        cleanup()
+    print(f"{name}:")
+    for operation, seconds in timings.items():
+        print(f"  {operation:38} {seconds * 1e6:10.1f} us")
+
+if __name__ == '__main__':
+    run_backend("memory", lambda: (memory_repos(), lambda: None))
+    run_backend("mongo", scratch_mongo_repos)
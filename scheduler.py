@@ -0,0 +1,113 @@
+import os
+import logging
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Periodic jobs shared by every gunicorn worker. Each worker runs the
+# scheduler thread; a job runs only in the worker holding its lease in the
+# scheduled_jobs collection, so it runs once per interval across all of them.
+
+# How often each worker checks for due jobs
+SCHEDULER_TICK = int(os.getenv('SCHEDULER_TICK', 30))
+
+# name -> {"interval": seconds, "lease": seconds, "run": function(db)}
+JOBS = {}
+
+# This worker, as recorded on the leases it holds
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def register_job(name, interval, lease):
+    """Run the decorated function(db) every `interval` seconds.
+
+    `lease` bounds how long one run may hold the job; a worker that dies
+    mid-run gives the job up when its lease runs out. The job should stop
+    well before that.
+    """
+    def decorator(run):
+        JOBS[name] = {"interval": interval, "lease": lease, "run": run}
+        return run
+    return decorator
+
+# --- LEASES ---
+
+def acquire_lease(db, name, seconds, owner=WORKER_ID, now=None):
+    """Take the job's lease if the job is due and nobody else holds it."""
+    now = now or datetime.utcnow()
+    try:
+        doc = db.scheduled_jobs.find_one_and_update(
+            {
+                "_id": name,
+                "$and": [
+                    {"$or": [{"lease_until": {"$lte": now}}, {"lease_until": None}, {"owner": owner}]},
+                    {"$or": [{"next_run_at": {"$lte": now}}, {"next_run_at": None}]}
+                ]
+            },
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=seconds), "started_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The job exists but is leased or not due: the upsert's insert collided
+        return False
+    return doc is not None and doc.get("owner") == owner
+
+def release_lease(db, name, interval, result, owner=WORKER_ID, now=None):
+    now = now or datetime.utcnow()
+    db.scheduled_jobs.update_one(
+        {"_id": name, "owner": owner},
+        {
+            "$set": {
+                "lease_until": None,
+                "next_run_at": now + timedelta(seconds=interval),
+                "last_run_at": now,
+                "last_result": result
+            },
+            "$unset": {"owner": ""}
+        }
+    )
+
+# --- RUNNING ---
+
+def run_due_jobs(db, now=None):
+    """Run every registered job this worker can lease; returns the names that ran."""
+    ran = []
+    for name, job in JOBS.items():
+        if not acquire_lease(db, name, job["lease"], now=now):
+            continue
+        try:
+            result = job["run"](db)
+        except Exception as e:
+            logger.exception("Scheduled job %s failed", name)
+            result = {"error": str(e)}
+        release_lease(db, name, job["interval"], result)
+        ran.append(name)
+    return ran
+
+def scheduler_worker(tick):
+    db = get_db_connection()
+    while True:
+        try:
+            run_due_jobs(db)
+        except Exception:
+            logger.exception("Scheduler tick failed")
+        time.sleep(tick)
+
+_scheduler_started = False
+
+def start_scheduler(tick=SCHEDULER_TICK):
+    global _scheduler_started
+    if _scheduler_started or os.getenv('SCHEDULER', '1') == '0':
+        return
+    _scheduler_started = True
+    threading.Thread(target=scheduler_worker, args=(tick,), daemon=True).start()
@@ -0,0 +1,96 @@
+import os
+from flask import Blueprint, request, jsonify
+from pymongo import MongoClient
+from bson import ObjectId
+from auth import require_role, current_identity, ALL_ROLES
+
+# Create a Blueprint for the search API
+search_api = Blueprint('search_api', __name__)
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGES = 50
+
+# Location words are rarer and more specific than description words
+GRIEVANCE_TEXT_WEIGHTS = {"location": 3, "description": 1}
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_search_indexes(db):
+    db.grievances.create_index(
+        [("location", "text"), ("description", "text")],
+        weights=GRIEVANCE_TEXT_WEIGHTS,
+        name="grievance_text"
+    )
+    db.feedback.create_index([("feedback_text", "text")], name="feedback_text")
+
+def search_scope(collection):
+    """Restrict a search to what the logged-in user may see.
+
+    Returns a filter, or None when the user may not search this collection.
+    """
+    identity = current_identity()
+    if identity["role"] == 'admin':
+        return {}
+    if identity["role"] == 'citizen':
+        return {"user_id": identity["id"]}
+    if identity["role"] == 'contractor' and collection == 'grievances':
+        return {"contractor_id": identity["id"]}
+    return None
+
+def text_search(collection, text, scope, fields, page=1, page_size=SEARCH_PAGE_SIZE):
+    """Run a ranked $text query and return one page of results plus a has-more flag."""
+    query = dict(scope, **{"$text": {"$search": text}})
+    projection = dict({field: 1 for field in fields}, score={"$meta": "textScore"})
+
+    results = list(
+        collection.find(query, projection)
+        .sort([("score", {"$meta": "textScore"})])
+        .skip((page - 1) * page_size)
+        .limit(page_size + 1)
+    )
+    return results[:page_size], len(results) > page_size
+
+def serialize(doc):
+    return {
+        key: str(value) if isinstance(value, ObjectId) else
+             value.isoformat() if hasattr(value, 'isoformat') else value
+        for key, value in doc.items()
+    }
+
+# Route to search grievances or feedback by text
+@search_api.route('/api/search', methods=['GET'])
+@require_role(*ALL_ROLES, api=True)
+def search():
+    text = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'grievances')
+    try:
+        page = max(1, min(int(request.args.get('page', 1)), MAX_SEARCH_PAGES))
+    except ValueError:
+        page = 1
+
+    if not text:
+        return jsonify({'error': 'Search text is required'}), 400
+    if kind not in ('grievances', 'feedback'):
+        return jsonify({'error': 'type must be grievances or feedback'}), 400
+
+    scope = search_scope(kind)
+    if scope is None:
+        return jsonify({'error': 'Not allowed'}), 403
+
+    db = get_db_connection()
+    if kind == 'grievances':
+        fields = ["location", "description", "status", "submitted_at", "contractor_id"]
+    else:
+        fields = ["feedback_text", "rating", "submitted_at"]
+
+    results, has_more = text_search(db[kind], text, scope, fields, page)
+
+    return jsonify({
+        'query': text,
+        'type': kind,
+        'page': page,
+        'has_more': has_more,
+        'results': [serialize(doc) for doc in results]
+    })
@@ -0,0 +1,165 @@
+import os
+import secrets
+from datetime import datetime
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from pymongo import MongoClient
+
+# Session ids are 128 random bits, URL-safe encoded (22 characters)
+SESSION_ID_BYTES = 16
+
+# Only rewrite an unchanged session once this much of its lifetime has passed
+REFRESH_FRACTION = 0.5
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data held server-side; the cookie only carries the session id."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+        self.rotate = False
+
+    def clear(self):
+        # Logging in or out starts a fresh session id (no session fixation)
+        super().clear()
+        self.rotate = True
+
+# --- STORES ---
+
+class MongoSessionStore:
+    """Sessions in the `sessions` collection, expired by a TTL index."""
+
+    def __init__(self, db=None):
+        self.db = db
+
+    def collection(self):
+        if self.db is None:
+            self.db = get_db_connection()
+            self.db.sessions.create_index("expires_at", expireAfterSeconds=0)
+        return self.db.sessions
+
+    def load(self, sid):
+        doc = self.collection().find_one({"_id": sid, "expires_at": {"$gt": datetime.utcnow()}})
+        return (doc["data"], doc["expires_at"]) if doc else (None, None)
+
+    def save(self, sid, data, expires_at):
+        self.collection().replace_one({"_id": sid}, {"data": data, "expires_at": expires_at}, upsert=True)
+
+    def delete(self, sid):
+        self.collection().delete_one({"_id": sid})
+
+class MemorySessionStore:
+    """Sessions in a dict; for tests and single-process development."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def load(self, sid):
+        data, expires_at = self.sessions.get(sid, (None, None))
+        if expires_at is None or expires_at <= datetime.utcnow():
+            return None, None
+        return dict(data), expires_at
+
+    def save(self, sid, data, expires_at):
+        self.sessions[sid] = (dict(data), expires_at)
+
+    def delete(self, sid):
+        self.sessions.pop(sid, None)
+
+def make_session_store():
+    kind = os.getenv('SESSION_STORE', 'mongo').lower()
+    if kind == 'memory':
+        return MemorySessionStore()
+    if kind == 'mongo':
+        return MongoSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE {kind!r} (expected mongo or memory)")
+
+# --- FLASK INTEGRATION ---
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def new_sid(self):
+        return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data, expires_at = self.store.load(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid, expires_at=expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.sid and (session.rotate or not session):
+            self.store.delete(session.sid)
+            if not session:
+                response.delete_cookie(name, domain=domain, path=path)
+                return
+            session.sid = None
+        if not session:
+            return
+
+        # Unchanged sessions are only rewritten to slide their expiry forward
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        needs_refresh = (
+            session.expires_at is None or
+            session.expires_at - now < lifetime * REFRESH_FRACTION
+        )
+        if session.sid and not session.modified and not needs_refresh:
+            return
+
+        is_new = session.sid is None
+        session.sid = session.sid or self.new_sid()
+        session.expires_at = now + lifetime
+        self.store.save(session.sid, dict(session), session.expires_at)
+
+        if is_new or needs_refresh:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def required_secret_key():
+    """SECRET_KEY from the environment; refuses to start without one.
+
+    A generated key would differ between gunicorn workers and across
+    restarts, logging everyone out, so there is no fallback.
+    """
+    key = os.getenv('SECRET_KEY')
+    if not key:
+        raise RuntimeError("SECRET_KEY is not set; set it in the environment or .env before starting the app")
+    return key
+
+def init_sessions(app, store=None):
+    store = store or make_session_store()
+    app.session_interface = ServerSessionInterface(store)
+    app.secret_key = required_secret_key()
+    return store
+
+def session_identity(session):
+    """The (role, id) of whoever is logged in, or (None, None)."""
+    for key, role in (('user_id', 'citizen'), ('admin_id', 'admin'), ('contractor_id', 'contractor')):
+        if key in session:
+            return role, session[key]
+    return None, None
@@ -0,0 +1,219 @@
+import os
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from pymongo import MongoClient, UpdateOne
+from auth import require_role
+from analytics import day_key
+from events import log_events, make_event
+from scheduler import register_job
+from workflow import PENDING, IN_PROGRESS, HISTORY_LIMIT
+
+# Create a Blueprint for the SLA API
+sla_api = Blueprint('sla_api', __name__)
+
+# How long a grievance may wait in each status, and the field its wait starts from.
+# A grievance is escalated one level per SLA period it has waited, up to MAX_ESCALATION_LEVEL.
+SLA_RULES = {
+    PENDING: {"field": "submitted_at", "days": int(os.getenv('SLA_PENDING_DAYS', 7))},
+    IN_PROGRESS: {"field": "assigned_at", "days": int(os.getenv('SLA_IN_PROGRESS_DAYS', 14))},
+}
+MAX_ESCALATION_LEVEL = 3
+
+# Sweep schedule and bounds: rows per query page and seconds per sweep
+SLA_SWEEP_INTERVAL = int(os.getenv('SLA_SWEEP_INTERVAL', 900))
+SLA_BATCH_SIZE = 500
+SLA_SWEEP_SECONDS = 20
+
+# Scheduler lease: comfortably longer than one bounded sweep
+SLA_LEASE_SECONDS = SLA_SWEEP_SECONDS * 3
+
+SYSTEM_ACTOR = {"role": "system", "id": None}
+
+def get_db_connection():
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    return client['urbanunity']
+
+def ensure_sla_indexes(db):
+    # New breaches: one status, not yet escalated in it, by the time its wait started
+    db.grievances.create_index([("status", 1), ("escalation.status", 1), ("submitted_at", 1), ("_id", 1)])
+    db.grievances.create_index([("status", 1), ("escalation.status", 1), ("assigned_at", 1), ("_id", 1)])
+    # Escalated grievances by the time their next level is due
+    db.grievances.create_index([("status", 1), ("escalation.status", 1), ("escalation.next_at", 1), ("_id", 1)])
+    db.grievances.create_index("escalation.level", sparse=True)
+
+def escalation_level(started, days, now):
+    if not started:
+        return 0
+    return min(int((now - started) / timedelta(days=days)), MAX_ESCALATION_LEVEL)
+
+def next_escalation_at(started, level, days):
+    """When a grievance at `level` is due for the next one (None at the top level)."""
+    if level >= MAX_ESCALATION_LEVEL:
+        return None
+    return started + timedelta(days=days) * (level + 1)
+
+def breach_queries(status, rule, now):
+    """(query, sort field) pairs for the grievances in `status` due a higher level.
+
+    New breaches not yet escalated in this status, then escalated grievances
+    whose next level is due. A grievance already at its current level
+    matches neither, so sweeps do not re-read it.
+    """
+    return [
+        ({"status": status, "escalation.status": {"$ne": status},
+          rule["field"]: {"$lt": now - timedelta(days=rule["days"])}}, rule["field"]),
+        ({"status": status, "escalation.status": status, "escalation.next_at": {"$lte": now}}, "escalation.next_at"),
+    ]
+
+def sort_value(grievance, field):
+    for part in field.split("."):
+        grievance = (grievance or {}).get(part)
+    return grievance
+
+def sweep_status(db, status, rule, now, deadline):
+    """Escalate one status's due grievances until done or past the deadline.
+
+    Returns (escalated (before, escalation) pairs, whether the scan finished).
+    """
+    escalated = []
+    for query, order in breach_queries(status, rule, now):
+        found, finished = sweep_query(db, status, rule, query, order, now, deadline)
+        escalated.extend(found)
+        if not finished:
+            return escalated, False
+    return escalated, True
+
+def sweep_query(db, status, rule, query, order, now, deadline):
+    """Escalate the grievances matching `query` in `order`, a page at a time."""
+    field = rule["field"]
+    escalated = []
+    after = None
+    while time.monotonic() < deadline:
+        page_query = query
+        if after:
+            last, last_id = after
+            page_query = dict(query, **{"$or": [{order: {"$gt": last}}, {order: last, "_id": {"$gt": last_id}}]})
+        page = list(db.grievances.find(
+            page_query,
+            {field: 1, "status": 1, "contractor_id": 1, "escalation": 1}
+        ).sort([(order, 1), ("_id", 1)]).limit(SLA_BATCH_SIZE))
+        if not page:
+            return escalated, True
+
+        updates, changes = [], []
+        for grievance in page:
+            level = escalation_level(grievance.get(field), rule["days"], now)
+            current = grievance.get("escalation") or {}
+            if level == 0 or (current.get("status") == status and current.get("level", 0) >= level):
+                continue
+            escalation = {
+                "status": status, "level": level, "at": now,
+                "next_at": next_escalation_at(grievance.get(field), level, rule["days"])
+            }
+            # Conditional on the status and wait start read above, so concurrent transitions win
+            updates.append(UpdateOne(
+                {"_id": grievance["_id"], "status": status, field: grievance.get(field)},
+                {"$set": {"escalation": escalation}, "$push": {"history": {"$each": [
+                    {"status": status, "action": "escalate", "by": None, "role": "system", "at": now, "level": level}
+                ], "$slice": -HISTORY_LIMIT}}}
+            ))
+            changes.append((grievance, escalation))
+
+        if updates:
+            result = db.grievances.bulk_write(updates, ordered=False)
+            if result.modified_count < len(updates):
+                # Some moved on concurrently: keep only the ones that took the new level
+                taken = {
+                    g["_id"] for g in db.grievances.find(
+                        {"_id": {"$in": [g["_id"] for g, _ in changes]}, "escalation.at": now}, {"_id": 1}
+                    )
+                }
+                changes = [(g, e) for g, e in changes if g["_id"] in taken]
+            escalated.extend(changes)
+
+        if len(page) < SLA_BATCH_SIZE:
+            return escalated, True
+        after = (sort_value(page[-1], order), page[-1]["_id"])
+    return escalated, False
+
+def update_sla_rollups(db, escalated, now):
+    """Count escalations per day and per contractor, one bulk_write per rollup."""
+    daily = {}
+    contractors = {}
+    for grievance, escalation in escalated:
+        key = f"escalated.{escalation['status']}.level{escalation['level']}"
+        daily[key] = daily.get(key, 0) + 1
+        if grievance.get("contractor_id"):
+            counts = contractors.setdefault(grievance["contractor_id"], {})
+            counts["escalations"] = counts.get("escalations", 0) + 1
+
+    if daily:
+        db.sla_daily.bulk_write([UpdateOne({"_id": day_key(now)}, {"$inc": daily}, upsert=True)])
+    if contractors:
+        db.sla_contractors.bulk_write([
+            UpdateOne({"_id": contractor_id}, {"$inc": inc, "$set": {"last_escalation_at": now}}, upsert=True)
+            for contractor_id, inc in contractors.items()
+        ], ordered=False)
+
+@register_job("sla_sweep", interval=SLA_SWEEP_INTERVAL, lease=SLA_LEASE_SECONDS)
+def sweep_sla(db, now=None, budget=SLA_SWEEP_SECONDS):
+    """Escalate grievances that have waited too long in pending or In Progress.
+
+    Each run stops after `budget` seconds; whatever is left is picked up by
+    the next run, since escalated grievances only match again once their
+    next level is due.
+    """
+    now = now or datetime.utcnow()
+    # Stored dates have millisecond precision; the sweep matches its own writes by `now`
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    deadline = time.monotonic() + budget
+    escalated, complete = [], True
+    for status, rule in SLA_RULES.items():
+        found, finished = sweep_status(db, status, rule, now, deadline)
+        escalated.extend(found)
+        complete = complete and finished
+
+    if escalated:
+        update_sla_rollups(db, escalated, now)
+        log_events(db, [
+            make_event(grievance["_id"], "escalate", escalation["status"], escalation["status"],
+                       SYSTEM_ACTOR, {"escalation": escalation}, now)
+            for grievance, escalation in escalated
+        ])
+    return {"escalated": len(escalated), "complete": complete}
+
+# --- API ---
+
+# Open grievances currently past their SLA, most escalated first
+@sla_api.route('/api/sla/breaches', methods=['GET'])
+@require_role('admin', api=True)
+def breaches():
+    db = get_db_connection()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), 500))
+    except ValueError:
+        limit = 100
+
+    # escalation.status equal to the current status: still waiting in the status it breached
+    query = {"escalation.level": {"$gte": 1}, "$expr": {"$eq": ["$escalation.status", "$status"]}}
+    grievances = db.grievances.find(
+        query,
+        {"location": 1, "status": 1, "submitted_at": 1, "assigned_at": 1, "contractor_id": 1, "escalation": 1}
+    ).sort([("escalation.level", -1), ("submitted_at", 1)]).limit(limit)
+
+    return jsonify({
+        'breaches': [
+            {
+                'id': str(g['_id']),
+                'location': g.get('location'),
+                'status': g.get('status'),
+                'contractor_id': str(g['contractor_id']) if g.get('contractor_id') else None,
+                'level': g['escalation']['level'],
+                'escalated_at': g['escalation']['at'].isoformat(),
+                'submitted_at': g['submitted_at'].isoformat() if g.get('submitted_at') else None
+            }
+            for g in grievances
+        ],
+        'last_sweep': db.scheduled_jobs.find_one({"_id": "sla_sweep"}, {"_id": 0, "owner": 0})
+    })
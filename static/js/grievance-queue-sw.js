@@ -0,0 +1,117 @@
+// Service worker that keeps grievance submissions made while offline
+// (or while the server is failing) and sends them again later.
+// Every queued submission keeps its Idempotency-Key, so the server
+// stores it once no matter how many times it is retried.
+
+const DB_NAME = 'urbanunity-queue';
+const STORE = 'grievances';
+const SYNC_TAG = 'grievance-queue';
+const SUBMIT_PATH = '/api/grievances';
+
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', event => event.waitUntil(self.clients.claim()));
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(DB_NAME, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'key' });
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+// Run one request against the queue store and resolve with its result
+function withStore(mode, action) {
+  return openQueue().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction(STORE, mode);
+    const request = action(tx.objectStore(STORE));
+    tx.oncomplete = () => resolve(request.result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+function enqueue(request, key) {
+  return request.formData().then(form => {
+    const entries = [];
+    form.forEach((value, name) => entries.push([name, value]));
+    return withStore('readwrite', store => store.put({ key: key, entries: entries, queuedAt: Date.now() }));
+  }).then(() => {
+    if (self.registration.sync) {
+      return self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+  });
+}
+
+function queuedResponse(key) {
+  return new Response(JSON.stringify({ queued: true, idempotency_key: key }), {
+    status: 202,
+    headers: { 'Content-Type': 'application/json' }
+  });
+}
+
+function notifyClients(message) {
+  return self.clients.matchAll().then(clients => clients.forEach(client => client.postMessage(message)));
+}
+
+// Send every queued submission, oldest first. Stops at the first network
+// error so the remaining ones wait for the next sync or 'online' event.
+function replayQueue() {
+  return withStore('readonly', store => store.getAll()).then(items => {
+    items.sort((a, b) => a.queuedAt - b.queuedAt);
+    return items.reduce((chain, item) => chain.then(() => {
+      const body = new FormData();
+      item.entries.forEach(([name, value]) => body.append(name, value));
+      return fetch(SUBMIT_PATH, {
+        method: 'POST',
+        body: body,
+        credentials: 'same-origin',
+        headers: { 'Idempotency-Key': item.key }
+      }).then(response => {
+        // Only a stored grievance leaves the queue; a repeat of an earlier
+        // success comes back as 200 with the same grievance
+        if (response.status === 200 || response.status === 201) {
+          return withStore('readwrite', store => store.delete(item.key))
+            .then(() => notifyClients({ type: 'grievance-sent', key: item.key, status: response.status }));
+        }
+        // Everything else stays queued. Server errors, rate limits, expired
+        // logins and 409 (the first attempt is still running) are retried
+        // quietly; other rejections are reported to the page.
+        if (response.status >= 400 && response.status < 500 && ![401, 409, 429].includes(response.status)) {
+          return response.json().catch(() => ({})).then(data => notifyClients({
+            type: 'grievance-failed', key: item.key, status: response.status, error: data.error
+          }));
+        }
+      });
+    }), Promise.resolve());
+  });
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  const key = request.headers.get('Idempotency-Key');
+  if (request.method !== 'POST' || new URL(request.url).pathname !== SUBMIT_PATH || !key) {
+    return;
+  }
+
+  const saved = request.clone();
+  event.respondWith(
+    fetch(request)
+      .then(response => response.status >= 500
+        ? enqueue(saved, key).then(() => queuedResponse(key))
+        : response)
+      .catch(() => enqueue(saved, key).then(() => queuedResponse(key)))
+  );
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(replayQueue());
+  }
+});
+
+// Pages ask for a replay on load and when the browser comes back online
+self.addEventListener('message', event => {
+  if (event.data === 'replay') {
+    event.waitUntil(replayQueue().catch(() => {}));
+  }
+});
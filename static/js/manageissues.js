@@ -0,0 +1,203 @@
+// Select-all checkboxes for the bulk action forms
+document.querySelectorAll('.select-all').forEach(function(toggle) {
+  toggle.addEventListener('change', function() {
+    document.querySelectorAll('input[name="ids"][form="' + this.dataset.target + '"]').forEach(function(box) {
+      box.checked = toggle.checked;
+    });
+  });
+});
+
+// Get dynamic status counts from Flask
+const statusCounts = JSON.parse(document.getElementById('status-counts').textContent);
+
+// Extract status names and counts
+const labels = Object.keys(statusCounts);
+const data = Object.values(statusCounts);
+
+// Define colors for different statuses
+const getStatusColor = (status) => {
+  const statusColors = {
+    'pending': '#ffc107',
+    'In Progress': '#17a2b8',
+    'Resolved': '#ffc107',
+    'completed': '#28a745'
+  };
+  return statusColors[status] || '#6c757d';
+};
+
+const backgroundColors = labels.map(status => getStatusColor(status));
+
+// Pie Chart for Issues
+const issuesCtx = document.getElementById('issuesChart').getContext('2d');
+const issuesChart = new Chart(issuesCtx, {
+  type: 'pie',
+  data: {
+    labels: labels,
+    datasets: [{
+      data: data,
+      backgroundColor: backgroundColors,
+      borderWidth: 0
+    }]
+  },
+  options: {
+    responsive: true,
+    plugins: {
+      legend: {
+        position: 'bottom'
+      }
+    }
+  }
+});
+
+let chatbotVisible = false;
+
+function toggleChatbot() {
+    const chatbot = document.getElementById('chatbot-container');
+    if (chatbot.classList.contains('minimized')) {
+        chatbot.classList.remove('minimized');
+        chatbotVisible = true;
+    } else {
+        minimizeChatbot();
+    }
+}
+
+function minimizeChatbot() {
+    document.getElementById('chatbot-container').classList.add('minimized');
+    chatbotVisible = false;
+}
+
+function closeChatbot() {
+    document.getElementById('chatbot-container').classList.add('hidden');
+}
+
+function openChatbot() {
+    const chatbot = document.getElementById('chatbot-container');
+    chatbot.classList.remove('hidden');
+    chatbot.classList.remove('minimized');
+    chatbotVisible = true;
+}
+
+function handleChatInput(e) {
+    if (e.key === 'Enter') {
+        sendMessage();
+    }
+}
+
+function sendMessage() {
+    const input = document.getElementById('chatbot-input');
+    const message = input.value.trim();
+
+    if (message) {
+        addMessage(message, 'user');
+        input.value = '';
+
+        setTimeout(() => {
+            const botResponse = getBotResponse(message);
+            addMessage(botResponse.text, 'bot', botResponse.actions);
+        }, 800);
+    }
+}
+
+function addMessage(text, sender, actions = null) {
+    const messagesContainer = document.getElementById('chatbot-messages');
+    const messageElement = document.createElement('div');
+    messageElement.classList.add('chatbot-message', `${sender}-message`);
+
+    const now = new Date();
+    const timeString = now.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+
+    messageElement.innerHTML = `
+        ${text}
+        <div class="message-timestamp">${timeString}</div>
+        ${actions ? createActionButtons(actions) : ''}
+    `;
+
+    messagesContainer.appendChild(messageElement);
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
+function createActionButtons(actions) {
+    let buttonsHTML = '<div class="chatbot-actions">';
+    actions.forEach(action => {
+        if (action.type === 'navigate') {
+            buttonsHTML += `<a href="${action.url}" class="chatbot-action">${action.text}</a>`;
+        }
+    });
+    buttonsHTML += '</div>';
+    return buttonsHTML;
+}
+
+function getBotResponse(message) {
+    const lowerMsg = message.toLowerCase();
+
+    if (lowerMsg.includes('report') || lowerMsg.includes('issue') || lowerMsg.includes('grievance')) {
+        return {
+            text: 'You can report a new issue by clicking the button below:',
+            actions: [{
+                type: 'navigate',
+                url: '/report-issue',
+                text: 'Report Issue'
+            }]
+        };
+    } else if (lowerMsg.includes('track') || lowerMsg.includes('status') || lowerMsg.includes('grievance')) {
+        return {
+            text: 'You can track your grievances here:',
+            actions: [{
+                type: 'navigate',
+                url: '/track-grievance',
+                text: 'Track Grievances'
+            }]
+        };
+    } else if (lowerMsg.includes('login') || lowerMsg.includes('sign in')) {
+        return {
+            text: 'Please select your login type:',
+            actions: [
+                {
+                    type: 'navigate',
+                    url: '/citizen-login',
+                    text: 'Citizen Login'
+                },
+                {
+                    type: 'navigate',
+                    url: '/admin-login',
+                    text: 'Admin Login'
+                },
+                {
+                    type: 'navigate',
+                    url: '/contractor-login',
+                    text: 'Contractor Login'
+                }
+            ]
+        };
+    } else if (lowerMsg.includes('help')) {
+        return {
+            text: 'I can help you with:\n- Reporting issues\n- Tracking grievances\n- Login assistance\n- General information\n\nWhat do you need help with?'
+        };
+    } else {
+        return {
+            text: "I'm here to help with UrbanUnity services. You can ask me about reporting issues, tracking grievances, or logging in to your account."
+        };
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const chatButton = document.createElement('div');
+    chatButton.innerHTML = '<i class="fas fa-comment-dots"></i>';
+    chatButton.style.position = 'fixed';
+    chatButton.style.bottom = '30px';
+    chatButton.style.right = '30px';
+    chatButton.style.width = '60px';
+    chatButton.style.height = '60px';
+    chatButton.style.backgroundColor = '#1e3c72';
+    chatButton.style.color = 'white';
+    chatButton.style.borderRadius = '50%';
+    chatButton.style.display = 'flex';
+    chatButton.style.justifyContent = 'center';
+    chatButton.style.alignItems = 'center';
+    chatButton.style.fontSize = '1.5rem';
+    chatButton.style.cursor = 'pointer';
+    chatButton.style.boxShadow = '0 4px 10px rgba(0,0,0,0.2)';
+    chatButton.style.zIndex = '999';
+    chatButton.addEventListener('click', openChatbot);
+    document.body.appendChild(chatButton);
+});
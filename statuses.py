@@ -0,0 +1,9 @@
+# Canonical grievance statuses. They live apart from workflow so the modules
+# workflow writes through (analytics, ...) can use them too; import them from
+# workflow everywhere else.
+PENDING = "pending"
+IN_PROGRESS = "In Progress"
+RESOLVED = "Resolved"        # done by the contractor, waiting for verification
+COMPLETED = "completed"      # verified by an admin
+
+STATUSES = [PENDING, IN_PROGRESS, RESOLVED, COMPLETED]
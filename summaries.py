@@ -0,0 +1,165 @@
+import logging
+from datetime import datetime
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from policies import with_policy
+
+logger = logging.getLogger(__name__)
+
+# Per-citizen grievance summary, one document per citizen in
+# citizen_summaries (_id = citizen id):
+#
+#   {"counts": {status: n, ...}, "recent": [newest SUMMARY_RECENT grievances],
+#    "state": "ready", "built_at": newest grievance time the rebuild saw}
+#
+# Submissions and status transitions update it in place, so the citizen
+# dashboard and the chatbot's stats read one document instead of every
+# grievance the citizen filed. Like the feedback rollup, writes only touch a
+# ready summary; a missing one is rebuilt on the next read.
+#
+# A rebuild first claims the document in the "building" state. A writer that
+# finds it building bumps its epoch, and the rebuild only saves if the epoch
+# is unchanged, so a grievance written while it was counting makes it count
+# again instead of being lost. Writers skip changes at or before built_at:
+# the rebuild already counted them.
+
+SUMMARY_RECENT = 5
+
+# Grievance fields kept in `recent`
+SUMMARY_FIELDS = ("location", "status", "submitted_at", "photo_path", "photo_thumbnail_url")
+
+# built_at of a citizen without grievances
+SUMMARY_EPOCH = datetime(1970, 1, 1)
+
+# Rebuild attempts before a read gives up saving and returns its count
+SUMMARY_REBUILD_ATTEMPTS = 3
+
+def summary_entry(grievance):
+    entry = {"_id": grievance["_id"]}
+    entry.update({field: grievance.get(field) for field in SUMMARY_FIELDS})
+    return entry
+
+def ready_filter(user_id, at):
+    return {"_id": user_id, "state": "ready", "built_at": {"$lt": at}}
+
+def invalidate_rebuilds(db, user_ids):
+    """Make rebuilds in progress for these citizens count again."""
+    db.citizen_summaries.update_many(
+        {"_id": {"$in": list(user_ids)}, "state": "building"},
+        {"$inc": {"epoch": 1}}
+    )
+
+# --- WRITE PATH ---
+
+def record_submission(db, grievance):
+    """Count a new grievance and put it at the front of `recent`."""
+    result = db.citizen_summaries.update_one(
+        ready_filter(grievance["user_id"], grievance["submitted_at"]),
+        {
+            "$inc": {f"counts.{grievance['status']}": 1},
+            "$push": {"recent": {"$each": [summary_entry(grievance)], "$position": 0, "$slice": SUMMARY_RECENT}}
+        }
+    )
+    if not result.matched_count:
+        invalidate_rebuilds(db, [grievance["user_id"]])
+
+def record_status_changes(db, changes, now):
+    """Move counts for each (before, target) status change made at `now`.
+
+    `before` is the grievance as it was (it needs _id, user_id and status).
+    """
+    changes = [
+        (before, target) for before, target in changes
+        if before.get("user_id") and before.get("status") != target
+    ]
+    if not changes:
+        return
+    result = db.citizen_summaries.bulk_write([
+        UpdateOne(
+            ready_filter(before["user_id"], now),
+            {
+                "$inc": {f"counts.{before.get('status')}": -1, f"counts.{target}": 1},
+                "$set": {"recent.$[entry].status": target}
+            },
+            array_filters=[{"entry._id": before["_id"]}]
+        )
+        for before, target in changes
+    ], ordered=False)
+    if result.matched_count < len(changes):
+        invalidate_rebuilds(db, {before["user_id"] for before, _ in changes})
+
+# --- READ PATH ---
+
+def count_summary(db, user_id):
+    """Count one citizen's summary from grievances and the archive.
+
+    built_at is the newest submission or status change it saw.
+    """
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": "$status",
+            "count": {"$sum": 1},
+            "latest": {"$max": {"$ifNull": ["$status_updated_at", "$submitted_at"]}}
+        }}
+    ]
+    projection = dict.fromkeys(SUMMARY_FIELDS, 1)
+    counts, recent, built_at = {}, [], SUMMARY_EPOCH
+    for collection in (db.grievances, db.grievances_archive):
+        for item in collection.aggregate(pipeline):
+            counts[item["_id"]] = counts.get(item["_id"], 0) + item["count"]
+            built_at = max(built_at, item.get("latest") or SUMMARY_EPOCH)
+        recent.extend(collection.find({"user_id": user_id}, projection)
+                      .sort([("submitted_at", -1), ("_id", -1)]).limit(SUMMARY_RECENT))
+    recent.sort(key=lambda g: (g.get("submitted_at") or datetime.min, g["_id"]), reverse=True)
+
+    return {
+        "counts": counts,
+        "recent": [summary_entry(g) for g in recent[:SUMMARY_RECENT]],
+        "state": "ready",
+        "built_at": built_at
+    }
+
+def claim_rebuild(db, user_id):
+    """The summary if it is ready, else its document claimed for a rebuild."""
+    try:
+        return db.citizen_summaries.find_one_and_update(
+            {"_id": user_id, "state": {"$ne": "ready"}},
+            {"$set": {"state": "building"}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another reader finished the rebuild first
+        return db.citizen_summaries.find_one({"_id": user_id})
+
+def rebuild_citizen_summary(db, user_id, attempts=SUMMARY_REBUILD_ATTEMPTS):
+    """Recount one citizen's summary from the primary and save it.
+
+    The count is only saved if no grievance of the citizen was written while
+    it ran; otherwise it counts again, up to `attempts` times.
+    """
+    db = with_policy(db, "rebuild")
+    for _ in range(attempts):
+        claimed = claim_rebuild(db, user_id)
+        if claimed.get("state") == "ready":
+            return claimed
+        summary = count_summary(db, user_id)
+        result = db.citizen_summaries.update_one(
+            {"_id": user_id, "state": "building", "epoch": claimed.get("epoch")},
+            {"$set": summary}
+        )
+        if result.modified_count:
+            return dict(summary, _id=user_id)
+    # Serve this count; the next read tries to save one again
+    logger.warning("Citizen summary %s kept changing during %d rebuilds", user_id, attempts)
+    return dict(summary, _id=user_id)
+
+def get_citizen_summary(db, user_id):
+    summary = db.citizen_summaries.find_one({"_id": user_id})
+    if summary is None or summary.get("state") != "ready":
+        summary = rebuild_citizen_summary(db, user_id)
+    # Counters of statuses a citizen no longer has are left at zero
+    summary["counts"] = {status: count for status, count in summary.get("counts", {}).items() if count}
+    summary["total"] = sum(summary["counts"].values())
+    return summary
@@ -0,0 +1,81 @@
+"""Geocoding without a network: the geocode cache, the gazetteer's geohash
+neighbour lookup and the stub provider. The cache tests need mongomock."""
+import pytest
+import geocode
+from geocode import (geohash_encode, geohash_bounds, geohash_neighbours, reverse_geocode,
+                     search_geocode, upstream_reverse, UpstreamError)
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()['urbanunity_geocode_test']
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(geocode, 'GEOCODER', 'stub')
+    monkeypatch.setattr(geocode, '_gazetteer', {"cells": {}, "names": {}})
+
+@pytest.fixture
+def gazetteer(tmp_path, monkeypatch):
+    """Load a gazetteer CSV of (name, latitude, longitude) rows."""
+    def load(rows):
+        path = tmp_path / 'places.csv'
+        path.write_text("name,latitude,longitude\n" + "".join(f"{n},{lat},{lng}\n" for n, lat, lng in rows))
+        monkeypatch.setattr(geocode, '_gazetteer', None)
+        return geocode.load_gazetteer(str(path))
+    return load
+
+def test_geohash_bounds_contain_the_point():
+    cell = geohash_encode(9.9816, 76.2999, 7)
+    south, west, north, east = geohash_bounds(cell)
+    assert south <= 9.9816 < north and west <= 76.2999 < east
+
+def test_geohash_neighbours():
+    cell = geohash_encode(9.9816, 76.2999, 5)
+    neighbours = geohash_neighbours(cell)
+    assert len(neighbours) == 9 and neighbours[4] == cell
+    south, west, north, east = geohash_bounds(cell)
+    # Points just outside each edge fall in a neighbouring cell
+    for lat, lng in ((north + 1e-4, west), (south - 1e-4, east - 1e-4), (south, west - 1e-4), (north - 1e-4, east + 1e-4)):
+        assert geohash_encode(lat, lng, 5) in neighbours
+
+def test_gazetteer_reverse_looks_across_the_cell_edge(stub, gazetteer):
+    south, west, north, east = geohash_bounds(geohash_encode(9.9816, 76.2999, 5))
+    # A place 100 m north of the point, but in the next geohash cell
+    point = (north - 0.0005, (west + east) / 2)
+    gazetteer([("Across the edge", north + 0.0004, point[1])])
+    assert geocode.gazetteer_reverse(*point)["display_name"] == "Across the edge"
+    assert geocode.gazetteer_reverse(south + 0.01, point[1]) is None
+
+def test_cache_hit(db, stub):
+    first, source = reverse_geocode(db, 9.9816, 76.2999)
+    assert source == "upstream"
+    # A nearby point in the same geohash cell is answered from the cache
+    second, source = reverse_geocode(db, 9.98161, 76.29991)
+    assert (second, source) == (first, "cache")
+
+def test_misses_are_cached(db, stub):
+    assert search_geocode(db, "Nowhere Street") == (None, "upstream")
+    assert search_geocode(db, "  nowhere   STREET ") == (None, "cache")
+
+def test_stub_falls_back_after_the_gazetteer(db, stub, gazetteer):
+    gazetteer([("MG Road", 9.9816, 76.2999)])
+    assert reverse_geocode(db, 9.9817, 76.2999)[0]["display_name"] == "MG Road"
+    assert search_geocode(db, "mg road") == (geocode.gazetteer_search("mg road"), "gazetteer")
+
+    result, source = reverse_geocode(db, 10.5, 76.5)
+    assert source == "upstream"
+    assert result == {"display_name": "Lat: 10.50000, Lng: 76.50000", "lat": 10.5, "lon": 76.5}
+
+def test_non_json_upstream_response(monkeypatch):
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            raise ValueError("Expecting value")
+
+    monkeypatch.setattr(geocode, 'GEOCODER', 'nominatim')
+    monkeypatch.setattr(geocode.requests, 'get', lambda *args, **kwargs: Response())
+    with pytest.raises(UpstreamError):
+        upstream_reverse(9.9816, 76.2999)
@@ -0,0 +1,81 @@
+import io
+import os
+import pytest
+from flask import Flask, request, jsonify
+from limits import init_limits, body_limit, MAX_FORM_FIELD_BYTES
+
+JPEG_HEAD = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01'
+
+def required_fields(form):
+    if not form.get('task_id') or not form.get('status'):
+        return "Missing required data!"
+    return None
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    init_limits(app)
+
+    @app.route('/api/upload', methods=['POST'])
+    @body_limit(max_bytes=2 * 1024 * 1024, validate=required_fields)
+    def upload():
+        photo = request.files['photo']
+        return jsonify({'size': len(photo.read()), 'type': photo.mimetype, 'status': request.form['status']})
+
+    return app.test_client()
+
+def multipart(parts, boundary='testboundary'):
+    """A multipart body with parts in the given order: (name, value) or (name, filename, bytes)."""
+    body = b''
+    for part in parts:
+        body += f'--{boundary}\r\n'.encode()
+        if len(part) == 3:
+            name, filename, data = part
+            body += (f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+        else:
+            name, value = part
+            body += f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    return body + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+def test_upload_of_several_hundred_kb_is_accepted(client):
+    photo = JPEG_HEAD + os.urandom(432 * 1024)
+    response = client.post('/api/upload', data={
+        'task_id': '1', 'status': 'Resolved', 'photo': (io.BytesIO(photo), 'proof.jpg')
+    })
+    assert response.status_code == 200
+    assert response.json == {'size': len(photo), 'type': 'image/jpeg', 'status': 'Resolved'}
+
+def test_fields_before_the_file_are_validated(client):
+    body, content_type = multipart([('task_id', '1'), ('photo', 'a.jpg', JPEG_HEAD + b'x' * 100)])
+    response = client.post('/api/upload', data=body, content_type=content_type)
+    assert response.status_code == 400
+
+def test_fields_in_form_order_pass(client):
+    # Hidden inputs first, then the file, as templates/contractor.html sends them
+    body, content_type = multipart([
+        ('idempotency_key', 'k'), ('task_id', '1'), ('status', 'Resolved'),
+        ('photo', 'a.jpg', JPEG_HEAD + os.urandom(100 * 1024))
+    ])
+    response = client.post('/api/upload', data=body, content_type=content_type)
+    assert response.status_code == 200
+
+def test_non_image_is_rejected(client):
+    response = client.post('/api/upload', data={
+        'task_id': '1', 'status': 'Resolved', 'photo': (io.BytesIO(b'<?php evil ?>' * 10), 'a.jpg')
+    })
+    assert response.status_code == 415
+
+def test_oversized_text_field_is_rejected(client):
+    body, content_type = multipart([
+        ('task_id', '1'), ('status', 'x' * (MAX_FORM_FIELD_BYTES + 1)), ('photo', 'a.jpg', JPEG_HEAD)
+    ])
+    response = client.post('/api/upload', data=body, content_type=content_type)
+    assert response.status_code == 413
+
+def test_body_over_route_cap_is_rejected(client):
+    response = client.post('/api/upload', data={
+        'task_id': '1', 'status': 'Resolved', 'photo': (io.BytesIO(JPEG_HEAD + os.urandom(3 * 1024 * 1024)), 'a.jpg')
+    })
+    assert response.status_code == 413
@@ -0,0 +1,91 @@
+"""The repository contract: the MongoDB repositories and their in-memory
+doubles must behave the same. Each test runs against every backend that is
+available here: memory always, mongomock when installed, and a real server
+when one answers at MONGODB_URI."""
+import os
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from repos import memory_repos, mongo_repos, ensure_repo_indexes
+
+@pytest.fixture(params=["memory", "mongomock", "mongo"])
+def repos(request):
+    if request.param == "memory":
+        yield memory_repos()
+        return
+
+    if request.param == "mongomock":
+        mongomock = pytest.importorskip("mongomock")
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=500)
+        try:
+            client.admin.command('ping')
+        except Exception:
+            pytest.skip("no MongoDB server at MONGODB_URI")
+
+    name = f"urbanunity_contract_{ObjectId()}"
+    ensure_repo_indexes(client[name])
+    yield mongo_repos(client[name])
+    client.drop_database(name)
+
+def test_citizens(repos):
+    citizen_id = repos.citizens.create({"username": "contract-citizen", "password": "x", "phone_number": "1"})
+    assert repos.citizens.get(citizen_id)["username"] == "contract-citizen"
+    assert repos.citizens.get(citizen_id, ["phone_number"]) == {"_id": citizen_id, "phone_number": "1"}
+    assert repos.citizens.find_by_username("contract-citizen")["_id"] == citizen_id
+    assert repos.citizens.find_by_username("nobody") is None
+    assert repos.citizens.get(ObjectId()) is None
+
+def test_contractors(repos):
+    contractor_id = repos.contractors.create({"username": "contract-contractor", "password": "secret"})
+    assert repos.contractors.get(contractor_id)["password"] == "secret"
+    assert repos.contractors.find_by_username("contract-contractor")["_id"] == contractor_id
+    assert all("password" not in c for c in repos.contractors.list_public())
+    assert contractor_id in [c["_id"] for c in repos.contractors.list_public()]
+
+def test_grievances(repos):
+    citizen_id, other_id = ObjectId(), ObjectId()
+    first = repos.grievances.create({
+        "user_id": citizen_id, "status": "pending", "submitted_at": datetime(2024, 1, 1), "idempotency_key": "k1"
+    })
+    second = repos.grievances.create({"user_id": citizen_id, "status": "completed", "submitted_at": datetime(2024, 1, 2)})
+    repos.grievances.create({"user_id": other_id, "status": "pending", "submitted_at": datetime(2024, 1, 3)})
+
+    assert repos.grievances.get(first)["status"] == "pending"
+    assert repos.grievances.get(first, user_id=other_id) is None
+    assert repos.grievances.get(ObjectId(), archived=True) is None
+    assert [g["_id"] for g in repos.grievances.list_for_user(citizen_id)] == [second, first]
+    assert repos.grievances.status_counts(citizen_id) == {"pending": 1, "completed": 1}
+    assert repos.grievances.status_counts() == {"pending": 2, "completed": 1}
+
+def test_grievance_idempotency_key(repos):
+    citizen_id, other_id = ObjectId(), ObjectId()
+    first = repos.grievances.create({
+        "user_id": citizen_id, "status": "pending", "submitted_at": datetime(2024, 1, 1), "idempotency_key": "k1"
+    })
+    with pytest.raises(DuplicateKeyError):
+        repos.grievances.create({
+            "user_id": citizen_id, "status": "pending", "submitted_at": datetime(2024, 1, 4), "idempotency_key": "k1"
+        })
+    # The same key from another citizen is a different submission
+    repos.grievances.create({"user_id": other_id, "status": "pending", "submitted_at": datetime(2024, 1, 4), "idempotency_key": "k1"})
+
+    assert repos.grievances.find_by_idempotency_key(citizen_id, "k1", ["status"]) == {"_id": first, "status": "pending"}
+    assert repos.grievances.find_by_idempotency_key(citizen_id, "k2") is None
+
+def test_returned_documents_are_copies(repos):
+    grievance_id = repos.grievances.create({"user_id": ObjectId(), "status": "pending", "submitted_at": datetime(2024, 1, 1)})
+    repos.grievances.get(grievance_id)["status"] = "changed"
+    assert repos.grievances.get(grievance_id)["status"] == "pending"
+
+def test_feedback(repos, request):
+    if request.node.callspec.params["repos"] == "mongomock":
+        pytest.skip("mongomock cannot apply the feedback write concern")
+    citizen_id = ObjectId()
+    older = repos.feedback.create({"user_id": citizen_id, "rating": 4, "submitted_at": datetime(2024, 1, 1)})
+    newer = repos.feedback.create({"user_id": citizen_id, "rating": None, "submitted_at": datetime(2024, 1, 2)})
+    assert [f["_id"] for f in repos.feedback.list_for_user(citizen_id)] == [newer, older]
+    assert repos.feedback.list_for_user(ObjectId()) == []
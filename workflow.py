@@ -0,0 +1,384 @@
+import logging
+from pymongo import UpdateOne, ReturnDocument
+from bson import ObjectId
+from datetime import datetime
+from analytics import record_change, record_changes, ANALYTICS_FIELDS
+from events import log_event, log_events, make_event
+from notify import queue_notifications
+from summaries import record_status_changes
+from policies import with_policy
+from statuses import PENDING, IN_PROGRESS, RESOLVED, COMPLETED, STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Allowed moves: current status -> statuses it may change to.
+# In Progress -> In Progress is a reassignment to another contractor.
+STATUS_TRANSITIONS = {
+    PENDING: {IN_PROGRESS},
+    IN_PROGRESS: {IN_PROGRESS, RESOLVED, PENDING},
+    RESOLVED: {COMPLETED, IN_PROGRESS},
+    COMPLETED: {IN_PROGRESS},
+}
+
+# Statuses each role may move a grievance to
+ROLE_TARGETS = {
+    "admin": set(STATUSES),
+    "contractor": {IN_PROGRESS, RESOLVED},
+}
+
+# Older spellings found in stored grievances and form posts
+LEGACY_STATUSES = {
+    "pending": PENDING,
+    "in progress": IN_PROGRESS,
+    "in-progress": IN_PROGRESS,
+    "inprogress": IN_PROGRESS,
+    "resolved": RESOLVED,
+    "completed": COMPLETED,
+    "complete": COMPLETED,
+    "verified": COMPLETED,
+}
+
+# Recent transitions kept on the grievance itself
+HISTORY_LIMIT = 100
+
+# Grievance fields read before a transition: what analytics needs, plus the
+# citizen and location for their notification
+TRANSITION_FIELDS = dict(ANALYTICS_FIELDS, user_id=1, location=1)
+
+def ensure_workflow_indexes(db):
+    db.grievances.create_index("batch_id", sparse=True)
+    ensure_workload_indexes(db)
+
+def normalize_status(status):
+    """Return the canonical spelling of a status, or None if it is unknown."""
+    if not status:
+        return None
+    return LEGACY_STATUSES.get(status.strip().lower())
+
+def allowed_sources(target):
+    return [status for status, targets in STATUS_TRANSITIONS.items() if target in targets]
+
+def normalize_statuses(db):
+    """Rewrite legacy status spellings in stored grievances (idempotent)."""
+    for status in db.grievances.distinct("status"):
+        canonical = normalize_status(status)
+        if canonical and canonical != status:
+            db.grievances.update_many({"status": status}, {"$set": {"status": canonical}})
+
+# --- CONTRACTOR WORKLOAD COUNTERS ---
+
+# Each contractor document carries a `workload` subdocument of counters:
+#   open                  assigned grievances not yet completed
+#   in_progress, pending_verification, completed
+#                         assigned grievances currently in that status
+#   revisions             revision requests on the contractor's work
+#   resolution_seconds, resolved_count, avg_resolution_hours
+#                         assignment-to-completion time of completed work
+# Transitions move them with $inc, but only on contractors that already have
+# a workload; backfill_workloads counts it for the rest before it is read.
+# rebuild_workload recounts everyone.
+STATUS_COUNTERS = {IN_PROGRESS: "in_progress", RESOLVED: "pending_verification", COMPLETED: "completed"}
+
+WORKLOAD_FIELDS = [
+    "open", "in_progress", "pending_verification", "completed",
+    "revisions", "resolution_seconds", "resolved_count", "avg_resolution_hours"
+]
+
+def ensure_workload_indexes(db):
+    # Leaderboard sort keys; workload.open also orders auto-assignment
+    for field in ("open", "in_progress", "pending_verification", "completed", "revisions", "avg_resolution_hours"):
+        db.contractors.create_index([(f"workload.{field}", 1)])
+
+def is_open(contractor_id, status):
+    return bool(contractor_id) and status != COMPLETED
+
+def workload_counters(contractor_id, status):
+    """The counters a grievance in `status` adds to its contractor."""
+    if not contractor_id:
+        return []
+    counters = ["open"] if is_open(contractor_id, status) else []
+    if status in STATUS_COUNTERS:
+        counters.append(STATUS_COUNTERS[status])
+    return counters
+
+# Recomputes the stored average after resolution_seconds / resolved_count move
+AVERAGE_RESOLUTION_UPDATE = [{"$set": {"workload.avg_resolution_hours": {"$divide": [
+    "$workload.resolution_seconds", {"$multiply": [{"$max": ["$workload.resolved_count", 1]}, 3600]}
+]}}}]
+
+def adjust_workloads(db, changes):
+    """Keep contractors' workload counters in step with grievance updates.
+
+    `changes` is a list of (before, fields) pairs: the grievance before the
+    update and the fields the update set. All counter moves go out in one
+    bulk_write.
+    """
+    increments = {}
+    def add(contractor_id, counter, amount):
+        counters = increments.setdefault(contractor_id, {})
+        counters[counter] = counters.get(counter, 0) + amount
+
+    for before, fields in changes:
+        if before is None:
+            continue
+
+        old_contractor, old_status = before.get("contractor_id"), before.get("status")
+        new_contractor = fields.get("contractor_id", old_contractor)
+        new_status = fields.get("status", old_status)
+
+        for counter in workload_counters(old_contractor, old_status):
+            add(old_contractor, counter, -1)
+        for counter in workload_counters(new_contractor, new_status):
+            add(new_contractor, counter, 1)
+
+        if new_contractor and old_status == RESOLVED and new_status == IN_PROGRESS and fields.get("revision_requested"):
+            add(new_contractor, "revisions", 1)
+
+        assigned_at, completed_at = before.get("assigned_at"), fields.get("status_updated_at")
+        if new_contractor and new_status == COMPLETED and old_status != COMPLETED and assigned_at and completed_at:
+            add(new_contractor, "resolution_seconds", int((completed_at - assigned_at).total_seconds()))
+            add(new_contractor, "resolved_count", 1)
+
+    updates = []
+    for contractor_id, counters in increments.items():
+        # A contractor without a workload is counted from scratch by backfill_workloads
+        counted = {"_id": contractor_id, "workload": {"$exists": True}}
+        inc = {f"workload.{counter}": amount for counter, amount in counters.items() if amount}
+        if inc:
+            updates.append(UpdateOne(counted, {"$inc": inc}))
+        if counters.get("resolved_count"):
+            updates.append(UpdateOne(counted, AVERAGE_RESOLUTION_UPDATE))
+    if updates:
+        # Ordered, so each average is computed after its increments
+        db.contractors.bulk_write(updates)
+
+def workload_pipeline(contractor_ids=None):
+    """Workload counters per contractor, from the grievances of one collection."""
+    completed = {"$eq": ["$status", COMPLETED]}
+    timed = {"$and": [completed, {"$gt": ["$assigned_at", None]}, {"$gt": ["$status_updated_at", None]}]}
+    match = {"contractor_id": {"$in": contractor_ids}} if contractor_ids is not None else {"contractor_id": {"$ne": None}}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$contractor_id",
+            "open": {"$sum": {"$cond": [completed, 0, 1]}},
+            "in_progress": {"$sum": {"$cond": [{"$eq": ["$status", IN_PROGRESS]}, 1, 0]}},
+            "pending_verification": {"$sum": {"$cond": [{"$eq": ["$status", RESOLVED]}, 1, 0]}},
+            "completed": {"$sum": {"$cond": [completed, 1, 0]}},
+            # Only the history kept on the grievance (HISTORY_LIMIT entries) is counted
+            "revisions": {"$sum": {"$size": {"$filter": {
+                "input": {"$ifNull": ["$history", []]},
+                "cond": {"$eq": ["$$this.action", "request_revision"]}
+            }}}},
+            "resolution_seconds": {"$sum": {"$cond": [
+                timed, {"$toLong": {"$divide": [{"$subtract": ["$status_updated_at", "$assigned_at"]}, 1000]}}, 0
+            ]}},
+            "resolved_count": {"$sum": {"$cond": [timed, 1, 0]}}
+        }}
+    ]
+
+def count_workloads(db, contractor_ids=None):
+    """Workload documents by contractor id, counted from grievances and the archive."""
+    totals = {}
+    for collection in (db.grievances, db.grievances_archive):
+        for doc in collection.aggregate(workload_pipeline(contractor_ids)):
+            counters = totals.setdefault(doc["_id"], {})
+            for field, value in doc.items():
+                if field != "_id":
+                    counters[field] = counters.get(field, 0) + value
+
+    workloads = {}
+    for contractor_id, counters in totals.items():
+        workload = {field: counters.get(field, 0) for field in WORKLOAD_FIELDS if field != "avg_resolution_hours"}
+        if workload["resolved_count"]:
+            workload["avg_resolution_hours"] = workload["resolution_seconds"] / workload["resolved_count"] / 3600
+        workloads[contractor_id] = workload
+    return workloads
+
+def empty_workload():
+    return {field: 0 for field in WORKLOAD_FIELDS if field != "avg_resolution_hours"}
+
+def rebuild_workload(db):
+    """Recount every contractor's workload counters from grievances and the archive."""
+    db = with_policy(db, "rebuild")
+    workloads = count_workloads(db)
+    updates = [
+        UpdateOne({"_id": contractor["_id"]}, {"$set": {"workload": workloads.get(contractor["_id"], empty_workload())}})
+        for contractor in db.contractors.find({}, {"_id": 1})
+    ]
+    if updates:
+        db.contractors.bulk_write(updates, ordered=False)
+
+def backfill_workloads(db):
+    """Count the workload of contractors that have none yet.
+
+    Contractors created before the counters existed (or inserted directly)
+    have no workload, and transitions skip them. Readers of the counters call
+    this first; it costs one query when there is nothing to do.
+    """
+    db = with_policy(db, "rebuild")
+    missing = [c["_id"] for c in db.contractors.find({"workload": {"$exists": False}}, {"_id": 1})]
+    if not missing:
+        return
+    workloads = count_workloads(db, missing)
+    # Only where still missing, so a concurrent backfill is not counted twice
+    db.contractors.bulk_write([
+        UpdateOne(
+            {"_id": contractor_id, "workload": {"$exists": False}},
+            {"$set": {"workload": workloads.get(contractor_id, empty_workload())}}
+        )
+        for contractor_id in missing
+    ], ordered=False)
+
+def get_workload(contractor):
+    """A contractor's counters, with zeros for those not set yet (no average
+    until something was completed)."""
+    workload = contractor.get("workload") or {}
+    counters = {field: workload.get(field, 0) for field in WORKLOAD_FIELDS}
+    average = workload.get("avg_resolution_hours")
+    counters["avg_resolution_hours"] = round(average, 2) if average is not None else None
+    return counters
+
+# --- TRANSITIONS ---
+
+def with_query(condition, query):
+    return {"$and": [query, condition]} if query else condition
+
+def transition_update(target, action, actor, fields, now, batch_id=None):
+    """The $set/$push document for one transition, history entry included."""
+    event = {"status": target, "action": action, "by": actor.get("id"), "role": actor.get("role"), "at": now}
+    changes = dict(fields, status=target, status_updated_at=now)
+    if batch_id:
+        changes["batch_id"] = batch_id
+    return {
+        "$set": changes,
+        "$push": {"history": {"$each": [event], "$slice": -HISTORY_LIMIT}}
+    }
+
+def after_commit(description, *effects):
+    """Run the follow-up writes of a change that has already committed.
+
+    `effects` are (function, *args) tuples. Each one runs even if an earlier
+    one failed, and failures are logged rather than raised: the change
+    itself applied, so the caller must not report it as failed.
+    """
+    for function, *args in effects:
+        try:
+            function(*args)
+        except Exception:
+            logger.exception("%s failed after %s", function.__name__, description)
+
+def transition(db, grievance_id, target, action, actor, fields=None, query=None):
+    """Move one grievance to `target` if the transition table allows it.
+
+    The current status is checked in the update filter itself (compare and
+    set), and the history entry is pushed by the same update, so two
+    concurrent transitions can never both apply. Returns the grievance as it
+    was before the update, or None if it was not found or not allowed.
+    """
+    if target not in ROLE_TARGETS.get(actor.get("role"), ()):
+        return None
+
+    now = datetime.utcnow()
+    fields = fields or {}
+    update = transition_update(target, action, actor, fields, now)
+    before = with_policy(db, "transition").grievances.find_one_and_update(
+        with_query({"_id": grievance_id, "status": {"$in": allowed_sources(target)}}, query),
+        update,
+        projection=TRANSITION_FIELDS,
+        return_document=ReturnDocument.BEFORE
+    )
+
+    if before is not None:
+        applied = update["$set"]
+        after_commit(
+            f"{action} of grievance {grievance_id}",
+            (adjust_workloads, db, [(before, applied)]),
+            (record_change, db, before, applied, now),
+            (log_event, db, grievance_id, action, before.get("status"), target, actor, applied, now),
+            (queue_notifications, db, [(before, target)], now),
+            (record_status_changes, db, [(before, target)], now)
+        )
+    return before
+
+def transition_many(db, items, target, action, actor, query=None):
+    """Apply one kind of transition to many grievances with one bulk write.
+
+    `items` is a list of (grievance_id, fields) pairs. Each update is
+    conditional on the status and contractor read just before it, so rows
+    changed concurrently are skipped rather than overwritten. Returns the
+    set of grievance ids that were moved.
+    """
+    if target not in ROLE_TARGETS.get(actor.get("role"), ()) or not items:
+        return set()
+
+    now = datetime.utcnow()
+    batch_id = ObjectId()
+    fields_by_id = dict(items)
+    grievances = with_policy(db, "transition").grievances
+    befores = list(grievances.find(
+        with_query({"_id": {"$in": list(fields_by_id)}, "status": {"$in": allowed_sources(target)}}, query),
+        TRANSITION_FIELDS
+    ))
+    if not befores:
+        return set()
+
+    updates = {
+        before["_id"]: transition_update(target, action, actor, fields_by_id[before["_id"]], now, batch_id)
+        for before in befores
+    }
+    result = grievances.bulk_write([
+        UpdateOne(
+            {"_id": before["_id"], "status": before.get("status"), "contractor_id": before.get("contractor_id")},
+            updates[before["_id"]]
+        )
+        for before in befores
+    ], ordered=False)
+
+    applied = befores
+    if result.modified_count < len(befores):
+        taken = {g["_id"] for g in grievances.find({"batch_id": batch_id}, {"_id": 1})}
+        applied = [before for before in befores if before["_id"] in taken]
+
+    changes = [(before, updates[before["_id"]]["$set"]) for before in applied]
+    events = [
+        make_event(before["_id"], action, before.get("status"), target, actor, fields, now)
+        for before, fields in changes
+    ]
+    after_commit(
+        f"{action} batch {batch_id}",
+        (adjust_workloads, db, changes),
+        (record_changes, db, changes, now),
+        (log_events, db, events),
+        (queue_notifications, db, [(before, target) for before in applied], now),
+        (record_status_changes, db, [(before, target) for before in applied], now)
+    )
+    return {before["_id"] for before in applied}
+
+def status_change_fields(target, now):
+    """Fields an admin's plain status change sets along with the status.
+
+    A grievance an admin moves to Resolved waits for verification, the same
+    as one a contractor resolves.
+    """
+    if target == RESOLVED:
+        return {"needs_verification": True, "revision_requested": False, "completed_at": now}
+    return {"needs_verification": False}
+
+def explain_failure(db, grievance_id, target, actor, query=None):
+    """A user-facing reason why a transition did not apply.
+
+    `actor` and `query` are the ones the transition was called with.
+    """
+    if target not in ROLE_TARGETS.get(actor.get("role"), ()):
+        return f"You cannot move a grievance to {target}."
+    grievance = db.grievances.find_one({"_id": grievance_id}, {"status": 1, "contractor_id": 1})
+    if grievance is None:
+        return "Grievance not found."
+    if actor.get("role") == "contractor" and grievance.get("contractor_id") != actor.get("id"):
+        return "This task is not assigned to you."
+    current = grievance.get("status")
+    allowed = current == target or target in STATUS_TRANSITIONS.get(current, ())
+    if not allowed or (query and not db.grievances.count_documents(with_query({"_id": grievance_id}, query), limit=1)):
+        return f"A grievance that is {current} cannot be moved to {target}."
+    return f"The grievance changed while you were working on it (now {current}). Please try again."